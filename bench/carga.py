@@ -0,0 +1,360 @@
+"""
+Generador de carga: miles de clientes sin interfaz que hablan el protocolo
+contra un servidor ya levantado. Entran de a grupos de --por-sala, uno crea
+la sala y el resto se une (con --por-sala menor a 4, el que la crea pide
+AGREGAR_BOT para los asientos que faltan), todos marcan listo y juegan sus
+turnos hasta que se acaba el tiempo; cuando una partida termina el grupo
+arma otra.
+
+En cada turno el jugador elige una accion segun --mezcla (pesos):
+
+  turno     LANZAR_DADO y MOVER_FICHA con una ficha legal al azar
+  terminar  LANZAR_DADO y TERMINAR_TURNO sin mover
+  chat      CHAT_SALA y despues un turno normal
+  general   MENSAJE_GENERAL (le llega a todos los conectados) y un turno
+
+La latencia es de pedido a difusion, medida en el propio cliente: desde que
+envia hasta que le llega el mensaje que el servidor difunde a la sala
+(RESULTADO_DADO, FICHAS_DELTA, CAMBIO_TURNO, MENSAJE_SALA o
+MENSAJE_GENERAL con su nombre). El RSS es el del proceso del servidor y sus
+hijos (los shards), leido de /proc.
+
+    python server/server.py --motor async &
+    python bench/carga.py --clientes 2000 --segundos 30
+    python bench/carga.py --clientes 400 --mezcla turno=6,terminar=1,chat=3 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+
+ACCIONES = ("turno", "terminar", "chat", "general")
+
+
+def leer_mezcla(texto):
+    pesos = dict.fromkeys(ACCIONES, 0)
+    for parte in texto.split(","):
+        accion, _, peso = parte.partition("=")
+        if accion not in pesos:
+            raise argparse.ArgumentTypeError(f"accion desconocida: {accion}")
+        pesos[accion] = float(peso or 1)
+    if not any(pesos.values()):
+        raise argparse.ArgumentTypeError("la mezcla no tiene ningun peso")
+    return pesos
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return float("nan")
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+# ---------------- RSS del servidor ----------------
+
+def buscar_servidor():
+    """pid del unico proceso 'server.py' (sin contar sus shards), o None."""
+    candidatos = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                partes = f.read().split(b"\0")
+            with open(f"/proc/{pid}/stat") as f:
+                padre = int(f.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        if any(p.endswith(b"server.py") for p in partes):
+            candidatos[int(pid)] = padre
+    raices = [pid for pid, padre in candidatos.items() if padre not in candidatos]
+    return raices[0] if len(raices) == 1 else None
+
+
+def rss_kb(pid):
+    """VmRSS del proceso mas el de todos sus descendientes, en kB."""
+    hijos = {}
+    for otro in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{otro}/stat") as f:
+                padre = int(f.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        hijos.setdefault(padre, []).append(int(otro))
+
+    total = 0
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pendientes.extend(hijos.get(actual, ()))
+        try:
+            with open(f"/proc/{actual}/status") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total += int(linea.split()[1])
+                        break
+        except OSError:
+            pass
+    return total
+
+
+# ---------------- clientes ----------------
+
+class Carga:
+    def __init__(self, args):
+        self.args = args
+        self.acciones = [a for a in ACCIONES if args.mezcla[a]]
+        self.pesos = [args.mezcla[a] for a in self.acciones]
+        self.latencias = {}         # pedido -> [segundos]
+        self.enviados = 0
+        self.recibidos = 0
+        self.partidas = 0
+        self.errores = 0
+        self.midiendo = False
+        self.fin = None             # asyncio.Event, se pone al acabar el tiempo
+
+    def anotar(self, pedido, desde):
+        if self.midiendo:
+            self.latencias.setdefault(pedido, []).append(time.perf_counter() - desde)
+
+
+class Grupo:
+    """Los --por-sala jugadores que comparten sala; el primero la crea."""
+
+    def __init__(self, jugadores):
+        self.jugadores = jugadores
+        for j in jugadores:
+            j.grupo = self
+        self.id_sala = None
+
+    def nueva_partida(self):
+        self.id_sala = None
+        self.jugadores[0].enviar("CREAR_PARTIDA", modo="1v1v1v1")
+
+    def sala_creada(self, id_sala):
+        self.id_sala = id_sala
+        for j in self.jugadores[1:]:
+            j.enviar("UNIR_PARTIDA", id_sala=id_sala)
+        # con --por-sala menor a 4 los asientos que faltan los ocupan bots
+        for _ in range(4 - len(self.jugadores)):
+            self.jugadores[0].enviar("AGREGAR_BOT", id_sala=id_sala)
+        for j in self.jugadores:
+            j.enviar("CAMBIAR_LISTO", id_sala=id_sala, listo=True)
+
+
+class Jugador:
+    def __init__(self, carga, nombre):
+        self.carga = carga
+        self.nombre = nombre
+        self.grupo = None
+        self.reader = self.writer = None
+        self.logueado = asyncio.Event()
+        self.accion = None
+        self.esperando = {}         # tipo de la difusion -> (pedido, instante del envio)
+
+    async def conectar(self, host, puerto):
+        self.reader, self.writer = await asyncio.open_connection(host, puerto, limit=1 << 20)
+        self.enviar("LOGIN", nombre=self.nombre, deltas=True)
+
+    def enviar(self, tipo, **data):
+        self.writer.write((json.dumps({"tipo": tipo, "data": data}) + "\n").encode("utf-8"))
+        self.carga.enviados += 1
+
+    def pedir(self, tipo, difusion, **data):
+        # pedido cuya latencia se mide hasta que llegue la difusion
+        self.esperando[difusion] = (tipo, time.perf_counter())
+        self.enviar(tipo, **data)
+
+    def recibido(self, difusion, propio=True):
+        espera = self.esperando.pop(difusion, None) if propio else None
+        if espera:
+            self.carga.anotar(*espera)
+
+    async def leer(self):
+        try:
+            while True:
+                linea = await self.reader.readline()
+                if not linea:
+                    break
+                self.carga.recibidos += 1
+                self.procesar(json.loads(linea))
+        except (ConnectionError, ValueError):
+            self.carga.errores += 1
+
+    def procesar(self, msg):
+        tipo = msg.get("tipo")
+        data = msg.get("data", {})
+        carga = self.carga
+
+        if tipo == "LOGIN_OK":
+            self.logueado.set()
+
+        elif tipo == "PARTIDA_CREADA":
+            self.grupo.sala_creada(data["id"])
+
+        elif tipo in ("INICIAR_PARTIDA", "CAMBIO_TURNO"):
+            self.recibido("CAMBIO_TURNO")
+            if data.get("jugador_actual") == self.nombre and not carga.fin.is_set():
+                asyncio.get_running_loop().call_later(carga.args.pausa, self.jugar)
+
+        elif tipo == "RESULTADO_DADO":
+            self.recibido("RESULTADO_DADO", data.get("jugador") == self.nombre)
+            legales = data.get("legales")
+            if data.get("jugador") != self.nombre or not legales:
+                return      # sin jugada el servidor ya paso el turno
+            if self.accion == "terminar":
+                self.pedir("TERMINAR_TURNO", "CAMBIO_TURNO", id_sala=self.grupo.id_sala)
+            else:
+                self.pedir("MOVER_FICHA", "FICHAS_DELTA", id_sala=self.grupo.id_sala,
+                           indice_ficha=random.choice(legales))
+
+        elif tipo in ("FICHAS_DELTA", "ESTADO_FICHAS"):
+            self.recibido("FICHAS_DELTA")
+
+        elif tipo == "MENSAJE_SALA":
+            self.recibido("MENSAJE_SALA", data.get("autor") == self.nombre)
+
+        elif tipo == "MENSAJE_GENERAL":
+            self.recibido("MENSAJE_GENERAL", data.get("autor") == self.nombre)
+
+        elif tipo == "FIN_PARTIDA":
+            carga.partidas += self.grupo.jugadores[0] is self
+            self.esperando.clear()
+            if self.grupo.jugadores[0] is self and not carga.fin.is_set():
+                self.grupo.nueva_partida()
+
+        elif tipo == "ERROR":
+            carga.errores += 1
+
+    def jugar(self):
+        carga = self.carga
+        if carga.fin.is_set():
+            return
+        self.accion = random.choices(carga.acciones, carga.pesos)[0]
+        id_sala = self.grupo.id_sala
+        if self.accion == "chat":
+            self.pedir("CHAT_SALA", "MENSAJE_SALA", id_sala=id_sala, texto="hola sala")
+        elif self.accion == "general":
+            self.pedir("MENSAJE_GENERAL", "MENSAJE_GENERAL", texto="hola lobby")
+        self.pedir("LANZAR_DADO", "RESULTADO_DADO", id_sala=id_sala)
+
+
+async def muestrear_rss(pid, muestras):
+    while True:
+        muestras.append(rss_kb(pid))
+        await asyncio.sleep(1)
+
+
+async def correr(args):
+    carga = Carga(args)
+    carga.fin = asyncio.Event()
+    jugadores = [Jugador(carga, f"carga{i}") for i in range(args.clientes)]
+    grupos = [Grupo(jugadores[i:i + args.por_sala])
+              for i in range(0, len(jugadores) - args.por_sala + 1, args.por_sala)]
+
+    inicio = time.perf_counter()
+    conexiones = asyncio.Semaphore(args.conexiones)
+    lectores = []
+
+    async def conectar(jugador):
+        async with conexiones:
+            await jugador.conectar(args.host, args.puerto)
+            lectores.append(asyncio.ensure_future(jugador.leer()))
+            await jugador.logueado.wait()
+
+    await asyncio.gather(*map(conectar, jugadores))
+    preparacion = time.perf_counter() - inicio
+
+    pid = args.pid or buscar_servidor()
+    rss = []
+    muestreo = asyncio.ensure_future(muestrear_rss(pid, rss)) if pid else None
+
+    carga.midiendo = True
+    enviados, recibidos = carga.enviados, carga.recibidos
+    comienzo = time.perf_counter()
+    for grupo in grupos:
+        grupo.nueva_partida()
+    await asyncio.sleep(args.segundos)
+    carga.fin.set()
+    carga.midiendo = False
+    duracion = time.perf_counter() - comienzo
+    enviados = carga.enviados - enviados
+    recibidos = carga.recibidos - recibidos
+
+    if muestreo:
+        muestreo.cancel()
+        rss.append(rss_kb(pid))
+    for jugador in jugadores:
+        jugador.writer.close()
+    for lector in lectores:
+        lector.cancel()
+
+    return {
+        "clientes": args.clientes,
+        "salas": len(grupos),
+        "segundos": round(duracion, 2),
+        "preparacion_s": round(preparacion, 2),
+        "enviados": enviados,
+        "recibidos": recibidos,
+        "msgs_por_s": round((enviados + recibidos) / duracion, 1),
+        "partidas_terminadas": carga.partidas,
+        "errores": carga.errores,
+        "rss_kb": {"inicio": rss[0], "fin": rss[-1], "max": max(rss)} if rss else None,
+        "latencias_ms": {
+            pedido: {"n": len(valores),
+                     "p50": round(percentil(valores, 50) * 1000, 3),
+                     "p95": round(percentil(valores, 95) * 1000, 3),
+                     "p99": round(percentil(valores, 99) * 1000, 3)}
+            for pedido, valores in ((p, sorted(v)) for p, v in sorted(carga.latencias.items()))
+        },
+    }
+
+
+def mostrar(r):
+    print(f"clientes {r['clientes']} en {r['salas']} salas, "
+          f"conexion y LOGIN en {r['preparacion_s']} s")
+    print(f"{r['segundos']} s: enviados {r['enviados']}, recibidos {r['recibidos']}, "
+          f"{r['msgs_por_s']:.0f} msgs/s, partidas terminadas {r['partidas_terminadas']}, "
+          f"errores {r['errores']}")
+    if r["rss_kb"]:
+        rss = r["rss_kb"]
+        print(f"RSS servidor: inicio {rss['inicio'] / 1024:.1f} MB, "
+              f"fin {rss['fin'] / 1024:.1f} MB, max {rss['max'] / 1024:.1f} MB")
+    else:
+        print("RSS servidor: no se encontro el proceso (usar --pid)")
+    print(f"{'pedido':16} {'n':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for pedido, l in r["latencias_ms"].items():
+        print(f"{pedido:16} {l['n']:8} {l['p50']:9.2f} {l['p95']:9.2f} {l['p99']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=5000)
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--por-sala", type=int, default=4)
+    parser.add_argument("--segundos", type=float, default=30)
+    parser.add_argument("--mezcla", type=leer_mezcla, default="turno=8,terminar=1,chat=1",
+                        help="pesos por accion, p. ej. turno=8,terminar=1,chat=1,general=0")
+    parser.add_argument("--pausa", type=float, default=0.0,
+                        help="segundos que piensa cada jugador antes de su turno")
+    parser.add_argument("--conexiones", type=int, default=50,
+                        help="conexiones abriendose a la vez (el backlog del servidor es chico)")
+    parser.add_argument("--pid", type=int, help="pid del servidor para medir RSS")
+    parser.add_argument("--json", action="store_true", help="resultado en JSON")
+    args = parser.parse_args()
+
+    # miles de sockets no entran en el limite por defecto de descriptores
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if blando < args.clientes + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(duro, args.clientes + 64), duro))
+
+    resultado = asyncio.run(correr(args))
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+    else:
+        mostrar(resultado)
+
+
+if __name__ == "__main__":
+    main()
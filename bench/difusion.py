@@ -0,0 +1,63 @@
+"""
+Compara el chat general enviando con enviar_json a cada cliente (un
+json.dumps por destinatario) contra difundir (un solo json.dumps).
+
+    python bench/difusion.py --clientes 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import server  # noqa: E402
+
+
+class SockNulo:
+    """Conexion que solo acumula bytes, para medir CPU sin red."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.formato = "json"
+
+    def enviar(self, data, clave=None):
+        self.bytes += len(data)
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    socks = [SockNulo() for _ in range(args.clientes)]
+    mensaje = {
+        "tipo": "MENSAJE_GENERAL",
+        "data": {"autor": "jugador", "texto": "hola a todos en el lobby ñandú"}
+    }
+
+    def por_destinatario():
+        for sock in socks:
+            server.enviar_json(sock, mensaje)
+
+    def una_vez():
+        server.difundir(socks, mensaje)
+
+    antes = medir(por_destinatario, args.repeticiones)
+    despues = medir(una_vez, args.repeticiones)
+    print(f"clientes: {args.clientes}")
+    print(f"enviar_json por destinatario: {antes * 1000:8.2f} ms/mensaje")
+    print(f"difundir (serializa 1 vez):   {despues * 1000:8.2f} ms/mensaje")
+    print(f"mejora: x{antes / despues:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Microbenchmarks de los caminos calientes del servidor, reproducibles
+(semilla fija, mejor de varias repeticiones, sin gc durante la medicion):
+
+  game.*        calcular_nueva_posicion y sus helpers, y la tabla de
+                Tablero.destino / movimientos_legales que la reemplaza
+  captura       Tablero.mover sobre una casilla ocupada (lo que hace
+                MOVER_FICHA para mandar rivales a la base)
+  framer.*      LineFramer.alimentar con recv de 4096 bytes, como
+                hilo_cliente y NetworkClient.hilo_receptor
+  enviar_json.* codificar y encolar un mensaje en JSON y en binario
+  lobby.*       listar 10k salas: info_publica + json.dumps de cada una
+                (como era LISTAR_PARTIDAS) y LobbyCache con y sin cache
+
+El resultado se puede guardar en JSON y comparar contra una base:
+
+    python bench/micro.py --salida base.json
+    python bench/micro.py --base base.json --umbral 0.15
+
+Con --base, sale con codigo 1 si algun caso quedo mas lento que la base
+por encima del umbral.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import game  # noqa: E402
+import lobby  # noqa: E402
+import server  # noqa: E402
+from framer import LineFramer  # noqa: E402
+from protocol import FORMATO_BINARIO, FORMATO_JSON  # noqa: E402
+
+SEMILLA = 1234
+SALAS_LOBBY = 10000
+
+
+class SockNulo:
+    """Conexion que solo cuenta bytes, para medir CPU sin red."""
+
+    def __init__(self, formato=FORMATO_JSON):
+        self.bytes = 0
+        self.formato = formato
+
+    def enviar(self, data, clave=None):
+        self.bytes += len(data)
+
+
+# ---------------- casos ----------------
+#
+# Cada caso arma su estado y devuelve (funcion, operaciones por llamada).
+
+def caso_calcular_nueva_posicion():
+    rnd = random.Random(SEMILLA)
+    posiciones = [None] + list(range(game.CAMINO_LEN)) + [("fin", n) for n in range(1, 7)]
+    entradas = [(rnd.choice(posiciones), rnd.randint(1, 6), rnd.choice(game.COLORES))
+                for _ in range(1000)]
+    calcular = game.calcular_nueva_posicion
+
+    def correr():
+        for pos, pasos, color in entradas:
+            calcular(pos, pasos, color)
+    return correr, len(entradas)
+
+
+def caso_helpers():
+    rnd = random.Random(SEMILLA)
+    entradas = [(rnd.randrange(game.CAMINO_LEN), rnd.randint(1, 6)) for _ in range(1000)]
+    salir, camino, meta = game.puede_salir_de_base, game.mover_en_camino, game.mover_en_meta
+
+    def correr():
+        for pos, pasos in entradas:
+            salir(pasos)
+            camino(pos, pasos)
+            meta(pos % 7, pasos)
+    return correr, len(entradas)
+
+
+def _tablero_al_azar(rnd):
+    pos = [rnd.choice((game.BASE, rnd.randrange(1, game.EN_META))) for _ in range(16)]
+    return game.Tablero.desde_codigos(pos)
+
+
+def caso_destino():
+    rnd = random.Random(SEMILLA)
+    tablero = _tablero_al_azar(rnd)
+    entradas = [(rnd.randrange(16), rnd.randint(1, 6)) for _ in range(1000)]
+    destino = tablero.destino
+
+    def correr():
+        for pieza, pasos in entradas:
+            destino(pieza, pasos)
+    return correr, len(entradas)
+
+
+def caso_movimientos_legales():
+    rnd = random.Random(SEMILLA)
+    tablero = _tablero_al_azar(rnd)
+    entradas = [(rnd.choice(game.COLORES), rnd.randint(1, 6)) for _ in range(1000)]
+    legales = tablero.movimientos_legales
+
+    def correr():
+        for color, pasos in entradas:
+            legales(color, pasos)
+    return correr, len(entradas)
+
+
+def caso_captura():
+    # azul 0 cae sobre dos rojas; despues se deja todo como estaba
+    tablero = game.Tablero()
+    origen, destino = 1 + 10, 1 + 14
+    tablero._colocar(0, origen)
+    tablero._colocar(4, destino)
+    tablero._colocar(5, destino)
+    mover, colocar = tablero.mover, tablero._colocar
+
+    def correr():
+        for _ in range(500):
+            for p in mover(0, destino):
+                colocar(p, destino)
+            colocar(0, origen)
+    return correr, 500
+
+
+def _lineas_en_recv(n_mensajes):
+    mensaje = {"tipo": "LANZAR_DADO", "data": {"id_sala": "3f9a0c21"}}
+    crudo = b"".join(server.codificar_json(mensaje) for _ in range(n_mensajes))
+    return [crudo[i:i + 4096] for i in range(0, len(crudo), 4096)]
+
+
+def caso_framer_json():
+    trozos = _lineas_en_recv(2000)
+
+    def correr():
+        framer = LineFramer()
+        for trozo in trozos:
+            framer.alimentar(trozo)
+    return correr, 2000
+
+
+def caso_framer_mensaje_grande():
+    # un PARTIDAS_DISPONIBLES de 1 MB que llega en recv de 4096 (lado cliente)
+    lista = [{"id": f"{i:08x}", "modo": "1v1v1v1", "jugadores": 1, "max": 4, "iniciada": False}
+             for i in range(12000)]
+    crudo = server.codificar_json({"tipo": "PARTIDAS_DISPONIBLES", "data": lista})
+    trozos = [crudo[i:i + 4096] for i in range(0, len(crudo), 4096)]
+
+    def correr():
+        framer = LineFramer(max_frame=8 * 1024 * 1024)
+        for trozo in trozos:
+            framer.alimentar(trozo)
+    return correr, 1
+
+
+def _caso_enviar(formato):
+    sock = SockNulo(formato)
+    mensaje = {"tipo": "CAMBIO_TURNO",
+               "data": {"id_sala": "3f9a0c21", "jugador_actual": "jugador_2"}}
+    enviar = server.enviar_json
+
+    def correr():
+        for _ in range(1000):
+            enviar(sock, mensaje)
+    return correr, 1000
+
+
+def _salas_lobby():
+    rnd = random.Random(SEMILLA)
+    salas = []
+    for i in range(SALAS_LOBBY):
+        creador = {"sock": SockNulo(), "nombre": f"jugador{i}", "sala_id": None}
+        sala = server.GameRoom("1v1v1v1", creador, id_sala=f"{i:08x}", semilla=i)
+        for j in range(rnd.randrange(4)):
+            sala.agregar_jugador({"sock": SockNulo(), "nombre": f"j{i}_{j}", "sala_id": None})
+        salas.append(sala)
+    return salas
+
+
+def caso_lobby_info_publica():
+    salas = _salas_lobby()
+
+    def correr():
+        server.codificar_json({"tipo": "PARTIDAS_DISPONIBLES",
+                               "data": [s.info_publica() for s in salas]})
+    return correr, 1
+
+
+def caso_lobby_cache():
+    cache = lobby.LobbyCache()
+    for sala in _salas_lobby():
+        cache.actualizar(sala.id, sala.info_publica())
+
+    def correr():
+        cache.responder({})
+    return correr, 1
+
+
+def caso_lobby_cache_invalidada():
+    # peor caso: una sala cambia entre cada pedido
+    cache = lobby.LobbyCache()
+    salas = _salas_lobby()
+    for sala in salas:
+        cache.actualizar(sala.id, sala.info_publica())
+    info = dict(salas[0].info_publica())
+
+    def correr():
+        info["jugadores"] = info["jugadores"] % 4 + 1
+        cache.actualizar(info["id"], dict(info))
+        cache.responder({})
+    return correr, 1
+
+
+CASOS = {
+    "game.calcular_nueva_posicion": caso_calcular_nueva_posicion,
+    "game.helpers": caso_helpers,
+    "game.Tablero.destino": caso_destino,
+    "game.Tablero.movimientos_legales": caso_movimientos_legales,
+    "captura": caso_captura,
+    "framer.json_4096": caso_framer_json,
+    "framer.mensaje_1mb": caso_framer_mensaje_grande,
+    "enviar_json.json": lambda: _caso_enviar(FORMATO_JSON),
+    "enviar_json.binario": lambda: _caso_enviar(FORMATO_BINARIO),
+    "lobby.info_publica_10k": caso_lobby_info_publica,
+    "lobby.cache_10k": caso_lobby_cache,
+    "lobby.cache_invalidada_10k": caso_lobby_cache_invalidada,
+}
+
+
+# ---------------- medicion ----------------
+
+def medir(fabrica, repeticiones, tiempo_minimo):
+    funcion, operaciones = fabrica()
+    temporizador = timeit.Timer(funcion)
+    # llamadas por repeticion para que cada una dure al menos tiempo_minimo
+    llamadas, _ = temporizador.autorange()
+    llamadas = max(1, int(llamadas * tiempo_minimo / 0.2))
+    tiempos = temporizador.repeat(repeat=repeticiones, number=llamadas)
+    return min(tiempos) / (llamadas * operaciones) * 1e6
+
+
+def comparar(resultados, base, umbral):
+    """[(caso, us base, us ahora, cambio relativo)] de los casos que empeoraron."""
+    peores = []
+    for caso, ahora in resultados["casos"].items():
+        antes = base.get("casos", {}).get(caso)
+        if antes is None:
+            continue
+        cambio = ahora["us_por_op"] / antes["us_por_op"] - 1
+        if cambio > umbral:
+            peores.append((caso, antes["us_por_op"], ahora["us_por_op"], cambio))
+    return peores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filtro", default="", help="solo los casos que contienen este texto")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tiempo", type=float, default=0.2,
+                        help="segundos minimos por repeticion")
+    parser.add_argument("--salida", help="guardar los resultados en este JSON")
+    parser.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--umbral", type=float, default=0.10,
+                        help="empeoramiento relativo tolerado (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    resultados = {
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "casos": {},
+    }
+    base = None
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)
+
+    for caso, fabrica in CASOS.items():
+        if args.filtro not in caso:
+            continue
+        us = medir(fabrica, args.repeticiones, args.tiempo)
+        resultados["casos"][caso] = {"us_por_op": round(us, 4)}
+        linea = f"{caso:34} {us:12.4f} us/op"
+        antes = base and base.get("casos", {}).get(caso)
+        if antes:
+            linea += f"   base {antes['us_por_op']:12.4f}  {us / antes['us_por_op'] - 1:+7.1%}"
+        print(linea, flush=True)
+
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+    if base is not None:
+        if base.get("python") != resultados["python"]:
+            print(f"ojo: la base es de Python {base.get('python')}")
+        peores = comparar(resultados, base, args.umbral)
+        for caso, antes, ahora, cambio in peores:
+            print(f"REGRESION {caso}: {antes:.4f} -> {ahora:.4f} us/op ({cambio:+.1%})")
+        if peores:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
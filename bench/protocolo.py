@@ -0,0 +1,76 @@
+"""
+Bytes y tiempo de codificar/decodificar los mensajes de un turno en JSON
+y en el protocolo binario.
+
+La ultima linea mide ESTADO_FICHAS como lo arma el servidor, desde el
+game.Tablero de la sala: a_json + json.dumps contra
+codec.codificar_estado_fichas sobre los codigos del tablero. Las demas
+lineas parten del dict del mensaje y del lado que decodifica se arma esa
+misma forma, por eso ahi la diferencia es menor (2-4x).
+
+    python bench/protocolo.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import codec  # noqa: E402
+from game import Tablero  # noqa: E402
+from server import codificar_json  # noqa: E402
+
+MENSAJES = [
+    {"tipo": "ESTADO_FICHAS", "data": {"fichas": {
+        "azul": [None, 3, ("fin", 2), None],
+        "rojo": [17, None, None, None],
+        "amarillo": [None, None, 40, None],
+        "verde": [None, None, None, None],
+    }, "seq": 12}},
+    {"tipo": "FICHAS_DELTA",
+     "data": {"id_sala": "3f9a0c21", "seq": 13,
+              "cambios": [["rojo", 0, None], ["azul", 1, 17]]}},
+    {"tipo": "CAMBIO_TURNO",
+     "data": {"id_sala": "3f9a0c21", "jugador_actual": "jugador_2"}},
+    {"tipo": "RESULTADO_DADO",
+     "data": {"jugador": "jugador_2", "valor": 5, "id_sala": "3f9a0c21",
+              "legales": [0, 2]}},
+]
+
+
+def main(n=50000):
+    total_json = total_bin = 0
+    for msg in MENSAJES:
+        como_json = codificar_json(msg)
+        como_bin = codec.codificar_binario(msg)
+        assert codec.decodificar_binario(como_bin) == msg
+
+        enc_json = timeit.timeit(lambda: codificar_json(msg), number=n) / n
+        enc_bin = timeit.timeit(lambda: codec.codificar_binario(msg), number=n) / n
+        dec_json = timeit.timeit(lambda: json.loads(como_json), number=n) / n
+        dec_bin = timeit.timeit(lambda: codec.decodificar_binario(como_bin), number=n) / n
+
+        total_json += len(como_json)
+        total_bin += len(como_bin)
+        print(f"{msg['tipo']:15} bytes {len(como_json):4} -> {len(como_bin):3} | "
+              f"codificar {enc_json * 1e6:5.2f} -> {enc_bin * 1e6:5.2f} us | "
+              f"decodificar {dec_json * 1e6:5.2f} -> {dec_bin * 1e6:5.2f} us")
+
+    print(f"bytes en total: {total_json} -> {total_bin} (x{total_json / total_bin:.1f})")
+
+    tablero = Tablero.desde_json(MENSAJES[0]["data"]["fichas"])
+    seq = MENSAJES[0]["data"]["seq"]
+    como_bin = codec.codificar_estado_fichas(tablero.pos, seq)
+    assert como_bin == codec.codificar_binario(MENSAJES[0])
+    enc_json = timeit.timeit(lambda: codificar_json(
+        {"tipo": "ESTADO_FICHAS", "data": {"fichas": tablero.a_json(), "seq": seq}}),
+        number=n) / n
+    enc_bin = timeit.timeit(lambda: codec.codificar_estado_fichas(tablero.pos, seq),
+                            number=n) / n
+    print(f"{'desde Tablero':15} codificar {enc_json * 1e6:5.2f} -> {enc_bin * 1e6:5.2f} us "
+          f"(x{enc_json / enc_bin:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import threading
 import json
 import sys
 
+from framer import LineFramer
+
 HOST = "127.0.0.1"
 PORT = 5000
 
@@ -19,7 +21,8 @@ def hilo_receptor(sock):
     """
     Hilo que recibe mensajes del servidor y los imprime.
     """
-    buffer = ""
+    # el listado de partidas puede ser grande: limite holgado del lado cliente
+    framer = LineFramer(max_frame=8 * 1024 * 1024)
     try:
         while True:
             data = sock.recv(4096)
@@ -27,16 +30,13 @@ def hilo_receptor(sock):
                 print("Servidor cerro la conexion")
                 break
 
-            buffer += data.decode("utf-8")
-
-            while "\n" in buffer:
-                linea, buffer = buffer.split("\n", 1)
+            for linea in framer.alimentar(data):
                 linea = linea.strip()
                 if not linea:
                     continue
                 try:
                     msg = json.loads(linea)
-                except json.JSONDecodeError as e:
+                except ValueError as e:
                     print(f"JSON invalido desde servidor: {e}")
                     continue
 
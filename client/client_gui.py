@@ -22,6 +22,7 @@ class App(tk.Tk):
         self.mi_nombre = None
         self.salas_disponibles = []
         self.sala_actual_id = None
+        self.seq_fichas = 0     # última versión del tablero que aplicamos
 
         self.frame_actual = None
         self.mostrar_login()
@@ -40,6 +41,14 @@ class App(tk.Tk):
     def mostrar_lobby(self):
         self.cambiar_frame(FrameLobby(self))
 
+    def aplicar_diff_lobby(self, data):
+        if data.get("completo"):
+            self.salas_disponibles = data.get("salas", [])
+            if isinstance(self.frame_actual, FrameLobby):
+                self.frame_actual.actualizar_lista()
+        elif isinstance(self.frame_actual, FrameLobby):
+            self.frame_actual.actualizar_lista(data)
+
     # -------------------- procesamiento de mensajes --------------------
 
     def procesar_mensaje(self, msg):
@@ -57,6 +66,10 @@ class App(tk.Tk):
             if isinstance(self.frame_actual, FrameLobby):
                 self.after(0, self.frame_actual.actualizar_lista)
 
+        elif tipo == "LOBBY_DIFF":
+            # la lista se toca solo desde el hilo de Tk, igual que la Listbox
+            self.after(0, lambda: self.aplicar_diff_lobby(data))
+
         elif tipo == "PARTIDA_CREADA":
             # el servidor devuelve info_publica de la sala
             messagebox.showinfo(
@@ -101,6 +114,7 @@ class App(tk.Tk):
                 self.after(0, lambda: self.frame_actual.agregar_chat(autor, texto))
 
         elif tipo == "INICIAR_PARTIDA":
+            self.seq_fichas = 0
             mensaje = data.get("mensaje", "La partida va a comenzar")
             jugador_actual = data.get("jugador_actual")
             messagebox.showinfo("Partida", mensaje)
@@ -111,6 +125,22 @@ class App(tk.Tk):
 
             self.after(0, _go)
 
+        elif tipo == "REANUDAR_PARTIDA":
+            # volvimos a nuestro asiento en una partida que ya iba
+            self.sala_actual_id = data.get("id_sala")
+            self.seq_fichas = data.get("seq", 0)
+            dado = data.get("dado")
+
+            def _go():
+                frame = FrameTablero(self, self.sala_actual_id, self.mi_nombre,
+                                     data.get("jugador_actual"))
+                self.cambiar_frame(frame)
+                frame.actualizar_fichas(data.get("fichas", {}))
+                if dado:
+                    frame.mostrar_dado(dado["jugador"], dado["valor"], dado.get("legales"))
+
+            self.after(0, _go)
+
         elif tipo == "ERROR":
             mensaje = data.get("mensaje", "Error desconocido")
             messagebox.showerror("Error", mensaje)
@@ -119,11 +149,17 @@ class App(tk.Tk):
         elif tipo == "RESULTADO_DADO":
             jugador = data.get("jugador")
             valor = data.get("valor")
+            legales = data.get("legales")
 
             if isinstance(self.frame_actual, FrameTablero):
-                self.after(0, lambda: self.frame_actual.mostrar_dado(jugador, valor))
+                self.after(0, lambda: self.frame_actual.mostrar_dado(jugador, valor, legales))
 
                 
+        elif tipo == "FIN_PARTIDA":
+            ganador = data.get("ganador")
+            self.after(0, lambda: messagebox.showinfo(
+                "Fin de la partida", f"Ganó {ganador} ({data.get('color')})"))
+
         elif tipo == "CAMBIO_TURNO":
             jugador_actual = data.get("jugador_actual")
             if isinstance(self.frame_actual, FrameTablero):
@@ -131,9 +167,22 @@ class App(tk.Tk):
         
         elif tipo == "ESTADO_FICHAS":
             fichas = data.get("fichas", {})
+            self.seq_fichas = data.get("seq", self.seq_fichas)
             if isinstance(self.frame_actual, FrameTablero):
                 self.after(0, lambda: self.frame_actual.actualizar_fichas(fichas))
 
+        elif tipo == "FICHAS_DELTA":
+            seq = data.get("seq")
+            if seq != self.seq_fichas + 1:
+                # nos perdimos un cambio: pedir el tablero completo
+                self.network.enviar({"tipo": "PEDIR_FICHAS",
+                                     "data": {"id_sala": self.sala_actual_id}})
+                return
+            self.seq_fichas = seq
+            cambios = data.get("cambios", [])
+            if isinstance(self.frame_actual, FrameTablero):
+                self.after(0, lambda: self.frame_actual.aplicar_cambios(cambios))
+
 
 # ============================================================
 # Frames
@@ -157,8 +206,14 @@ class FrameLogin(tk.Frame):
             messagebox.showwarning("Nombre inválido", "Ingresa un nombre")
             return
 
-        msg = {"tipo": "LOGIN", "data": {"nombre": nombre}}
-        self.app.network.enviar(msg)
+        # deltas: el tablero llega como cambios sueltos (FICHAS_DELTA)
+        msg = {"tipo": "LOGIN", "data": {"nombre": nombre, "deltas": True}}
+        # de paso nos suscribimos al lobby, asi ya abre con la lista y
+        # despues le llegan solo los cambios (LOBBY_DIFF)
+        self.app.network.enviar_lote([
+            msg,
+            {"tipo": "SUSCRIBIR_LOBBY", "data": {}},
+        ])
 
 
 class FrameLobby(tk.Frame):
@@ -185,6 +240,8 @@ class FrameLobby(tk.Frame):
                   command=self.listar, width=15).grid(row=0, column=0, padx=5)
         tk.Button(botones, text="Crear partida",
                   command=self.crear, width=15).grid(row=0, column=1, padx=5)
+        tk.Button(botones, text="Buscar partida",
+                  command=self.buscar, width=15).grid(row=0, column=2, padx=5)
 
         # Lista de partidas
         tk.Label(self, text="Partidas disponibles:",
@@ -195,15 +252,22 @@ class FrameLobby(tk.Frame):
         tk.Button(self, text="Unirse a partida",
                   command=self.unirse).pack(pady=10)
 
+        self.actualizar_lista()
+
     def listar(self):
         msg = {"tipo": "LISTAR_PARTIDAS", "data": {}}
         self.app.network.enviar(msg)
 
     def crear(self):
-        # por ahora solo modo 1v1v1v1
+        # por ahora solo modo 1v1v1v1; la sala nueva llega por LOBBY_DIFF
         msg = {"tipo": "CREAR_PARTIDA", "data": {"modo": "1v1v1v1"}}
         self.app.network.enviar(msg)
 
+    def buscar(self):
+        # el servidor nos mete en una sala abierta (o abre una)
+        msg = {"tipo": "BUSCAR_PARTIDA", "data": {"modo": "1v1v1v1"}}
+        self.app.network.enviar(msg)
+
     def unirse(self):
         sel = self.lista.curselection()
         if not sel:
@@ -213,11 +277,45 @@ class FrameLobby(tk.Frame):
         msg = {"tipo": "UNIR_PARTIDA", "data": {"id_sala": sala["id"]}}
         self.app.network.enviar(msg)
 
-    def actualizar_lista(self):
-        self.lista.delete(0, tk.END)
-        for sala in self.app.salas_disponibles:
-            texto = f"ID {sala['id']} | {sala['modo']} | {sala['jugadores']}/{sala['max']}"
-            self.lista.insert(tk.END, texto)
+    def destroy(self):
+        # fuera del lobby no hace falta que nos sigan mandando cambios
+        self.app.network.enviar({"tipo": "SUSCRIBIR_LOBBY", "data": {"activo": False}})
+        super().destroy()
+
+    @staticmethod
+    def texto_sala(sala):
+        texto = f"ID {sala['id']} | {sala['modo']} | {sala['jugadores']}/{sala['max']}"
+        return texto + " | en juego" if sala.get("iniciada") else texto
+
+    def actualizar_lista(self, diff=None):
+        salas = self.app.salas_disponibles
+        if diff is None:
+            self.lista.delete(0, tk.END)
+            for sala in salas:
+                self.lista.insert(tk.END, self.texto_sala(sala))
+            return
+
+        # LOBBY_DIFF: solo se tocan las filas que cambiaron
+        quitadas = set(diff.get("quitadas", ()))
+        for i in reversed(range(len(salas))):
+            if salas[i]["id"] in quitadas:
+                del salas[i]
+                self.lista.delete(i)
+
+        posiciones = {sala["id"]: i for i, sala in enumerate(salas)}
+        seleccion = self.lista.curselection()
+        for sala in diff.get("salas", ()):
+            i = posiciones.get(sala["id"])
+            if i is None:
+                posiciones[sala["id"]] = len(salas)
+                salas.append(sala)
+                self.lista.insert(tk.END, self.texto_sala(sala))
+            else:
+                salas[i] = sala
+                self.lista.delete(i)
+                self.lista.insert(i, self.texto_sala(sala))
+                if i in seleccion:
+                    self.lista.selection_set(i)
 
     def agregar_chat(self, autor, texto):
         self.chat.config(state="normal")
@@ -249,6 +347,9 @@ class FrameSalaEspera(tk.Frame):
                                      command=self.marcar_listo)
         self.boton_listo.pack(pady=5)
 
+        # el servidor completa un asiento libre con un bot que ya esta listo
+        tk.Button(self, text="Agregar bot", command=self.agregar_bot).pack(pady=5)
+
         tk.Label(self, text="Chat de sala:").pack()
         self.chat = tk.Text(self, height=10, state="disabled")
         self.chat.pack(fill="both", expand=True, padx=10, pady=5)
@@ -271,6 +372,10 @@ class FrameSalaEspera(tk.Frame):
         self.app.network.enviar(msg)
         self.boton_listo.config(text="Esperando...", state="disabled")
 
+    def agregar_bot(self):
+        self.app.network.enviar({"tipo": "AGREGAR_BOT",
+                                 "data": {"id_sala": self.id_sala}})
+
     def enviar_chat(self, event):
         txt = self.entry_chat.get().strip()
         if txt:
@@ -482,14 +587,19 @@ class FrameTablero(tk.Frame):
         }
         self.app.network.enviar(msg)
 
-    def mostrar_dado(self, jugador, valor):
+    def mostrar_dado(self, jugador, valor, legales=None):
+        if legales == []:
+            # el servidor ya pasó el turno
+            self.lbl_dado.config(text=f"Dado ({jugador}): {valor} - sin jugadas")
+            return
         self.lbl_dado.config(text=f"Dado ({jugador}): {valor}")
         if jugador == self.mi_nombre:
+            # servidores viejos no mandan legales: probamos con la primera ficha
             msg = {
                 "tipo": "MOVER_FICHA",
                 "data": {
                     "id_sala": self.id_sala,
-                    "indice_ficha": 0
+                    "indice_ficha": legales[0] if legales else 0
                 }
             }
             self.app.network.enviar(msg)
@@ -517,6 +627,16 @@ class FrameTablero(tk.Frame):
         return coords[:52]
 
     def actualizar_fichas(self, fichas_estado):
+        for color, lista_pos in fichas_estado.items():
+            for i, pos in enumerate(lista_pos):
+                self.colocar_ficha(color, i, pos)
+
+    def aplicar_cambios(self, cambios):
+        # solo se mueven las fichas que cambiaron
+        for color, i, pos in cambios:
+            self.colocar_ficha(color, i, pos)
+
+    def colocar_ficha(self, color, i, pos):
         cell = 40
         offset = 20
         r = cell * 0.3
@@ -529,38 +649,36 @@ class FrameTablero(tk.Frame):
             "amarillo": [(11, 11), (11, 13), (13, 11), (13, 13)],
         }
 
-        for color, lista_pos in fichas_estado.items():
-            items = self.fichas_items.get(color, [])
-            for i, pos in enumerate(lista_pos):
-                if i >= len(items):
-                    continue
-                item_id = items[i]
-
-                if pos is None:
-                    # en base
-                    f, c = bases[color][i]
-                    cx = offset + c * cell + cell / 2
-                    cy = offset + f * cell + cell / 2
-                elif isinstance(pos, int):
-                    if 0 <= pos < len(self.camino):
-                        cx, cy = self.camino[pos]
-                    else:
-                        continue
-                elif isinstance(pos, (list, tuple)) and pos[0] == "fin":
-                    idx_fin = pos[1]
-                    # ejemplo: colocar la recta final cerca del centro según color
-                    # aquí puedes inventarte 6 casillas hacia el centro
-                    # por ahora las apilamos cerca del centro
-                    cx = 20 + 7 * cell + (idx_fin - 1) * 5
-                    cy = 20 + 7 * cell
-                else:
-                    continue
-
-                # mover la ficha a (cx, cy)
-                self.canvas.coords(
-                    item_id,
-                    cx - r, cy - r, cx + r, cy + r
-                )
+        items = self.fichas_items.get(color, [])
+        if i >= len(items):
+            return
+        item_id = items[i]
+
+        if pos is None:
+            # en base
+            f, c = bases[color][i]
+            cx = offset + c * cell + cell / 2
+            cy = offset + f * cell + cell / 2
+        elif isinstance(pos, int):
+            if 0 <= pos < len(self.camino):
+                cx, cy = self.camino[pos]
+            else:
+                return
+        elif isinstance(pos, (list, tuple)) and pos[0] == "fin":
+            idx_fin = pos[1]
+            # ejemplo: colocar la recta final cerca del centro según color
+            # aquí puedes inventarte 6 casillas hacia el centro
+            # por ahora las apilamos cerca del centro
+            cx = 20 + 7 * cell + (idx_fin - 1) * 5
+            cy = 20 + 7 * cell
+        else:
+            return
+
+        # mover la ficha a (cx, cy)
+        self.canvas.coords(
+            item_id,
+            cx - r, cy - r, cx + r, cy + r
+        )
 
 
 
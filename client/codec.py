@@ -0,0 +1,133 @@
+"""
+Codificacion binaria compacta de los mensajes mas frecuentes de una
+partida. Los clientes que la piden en LOGIN ("formato": "binario") los
+reciben asi; el resto de mensajes (y los clientes viejos) siguen en JSON.
+
+Frame:  0x00 | largo (2 bytes, big endian) | codigo (1 byte) | campos
+
+  ESTADO_FICHAS   seq (4 bytes) | 16 bytes, una posicion por ficha en orden de COLORES
+  CAMBIO_TURNO    id_sala (4 bytes) | nombre
+  RESULTADO_DADO  id_sala (4 bytes) | valor (1 byte) | nombre | legales (1 byte,
+                  bit i = la ficha i se puede mover)
+  FICHAS_DELTA    id_sala (4 bytes) | seq (4 bytes) | por cambio: ficha (1 byte,
+                  color * 4 + indice) | posicion (1 byte)
+
+Posicion: 0xFF = base, 0..51 = casilla del camino, 0x80 | n = ("fin", n).
+id_sala son los 8 hex de GameRoom.id. nombre: largo (1 byte) + UTF-8.
+
+El servidor arma ESTADO_FICHAS con codificar_estado_fichas() directo desde
+los codigos de game.Tablero (un bytes.translate), sin pasar por la forma JSON.
+"""
+import struct
+from itertools import chain
+
+from protocol import (ESTADO_FICHAS, CAMBIO_TURNO, RESULTADO_DADO, FICHAS_DELTA,
+                      COD_ESTADO_FICHAS, COD_CAMBIO_TURNO, COD_RESULTADO_DADO,
+                      COD_FICHAS_DELTA)
+
+COLORES = ("azul", "rojo", "amarillo", "verde")
+
+_CABECERA = struct.Struct(">BHB")     # marca, largo, codigo
+_SEQ = struct.Struct(">I")
+_BASE = 0xFF
+_META = 0x80
+
+# tablas de traduccion posicion <-> byte, armadas una sola vez
+_A_BYTE = {None: _BASE}
+_A_BYTE.update({i: i for i in range(52)})
+_A_BYTE.update({("fin", n): _META | n for n in range(7)})
+_DE_BYTE = [None] * 256
+for _pos, _b in _A_BYTE.items():
+    _DE_BYTE[_b] = _pos
+# codigo de game.Tablero (0 base, 1..52 camino, 53 + n meta) -> byte
+_DE_CODIGO = bytes([_BASE] + list(range(52)) + [_META | n for n in range(7)]).ljust(256, b"\xff")
+_CAB_ESTADO_FICHAS = _CABECERA.pack(0, 1 + _SEQ.size + 16, COD_ESTADO_FICHAS)
+
+
+def es_binario(frame):
+    return frame[:1] == b"\x00"
+
+
+def _enmarcar(codigo, cuerpo):
+    return _CABECERA.pack(0, len(cuerpo) + 1, codigo) + cuerpo
+
+
+def _nombre(nombre):
+    crudo = nombre.encode("utf-8")
+    if len(crudo) > 255:
+        raise ValueError("nombre demasiado largo")
+    return bytes((len(crudo),)) + crudo
+
+
+def codificar_estado_fichas(pos, seq):
+    """ESTADO_FICHAS desde las 16 posiciones codificadas de un game.Tablero."""
+    return _CAB_ESTADO_FICHAS + _SEQ.pack(seq) + bytes(pos).translate(_DE_CODIGO)
+
+
+def codificar_binario(msg):
+    """Bytes del frame binario, o None si el mensaje no tiene forma binaria."""
+    tipo = msg.get("tipo")
+    data = msg.get("data", {})
+    try:
+        if tipo == ESTADO_FICHAS:
+            fichas = data["fichas"]
+            cuerpo = _SEQ.pack(data.get("seq", 0)) + bytes(map(
+                _A_BYTE.__getitem__, chain.from_iterable(fichas[c] for c in COLORES)))
+            return _enmarcar(COD_ESTADO_FICHAS, cuerpo)
+
+        if tipo == FICHAS_DELTA:
+            cuerpo = bytearray(bytes.fromhex(data["id_sala"]) + _SEQ.pack(data["seq"]))
+            for color, indice, pos in data["cambios"]:
+                cuerpo += bytes((COLORES.index(color) * 4 + indice, _A_BYTE[pos]))
+            return _enmarcar(COD_FICHAS_DELTA, bytes(cuerpo))
+
+        if tipo == CAMBIO_TURNO:
+            cuerpo = bytes.fromhex(data["id_sala"]) + _nombre(data["jugador_actual"])
+            return _enmarcar(COD_CAMBIO_TURNO, cuerpo)
+
+        if tipo == RESULTADO_DADO:
+            legales = sum(1 << i for i in data.get("legales", ()))
+            cuerpo = (bytes.fromhex(data["id_sala"]) + bytes((data["valor"],))
+                      + _nombre(data["jugador"]) + bytes((legales,)))
+            return _enmarcar(COD_RESULTADO_DADO, cuerpo)
+    except (KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def decodificar_binario(frame):
+    """Frame binario completo (con cabecera) -> mensaje con la forma del JSON."""
+    codigo = frame[3]
+
+    if codigo == COD_ESTADO_FICHAS:
+        pos = list(map(_DE_BYTE.__getitem__, frame[8:24]))
+        fichas = {"azul": pos[0:4], "rojo": pos[4:8],
+                  "amarillo": pos[8:12], "verde": pos[12:16]}
+        return {"tipo": ESTADO_FICHAS,
+                "data": {"fichas": fichas, "seq": _SEQ.unpack_from(frame, 4)[0]}}
+
+    id_sala = frame[4:8].hex()
+
+    if codigo == COD_CAMBIO_TURNO:
+        largo = frame[8]
+        return {"tipo": CAMBIO_TURNO,
+                "data": {"id_sala": id_sala,
+                         "jugador_actual": frame[9:9 + largo].decode("utf-8")}}
+
+    if codigo == COD_RESULTADO_DADO:
+        largo = frame[9]
+        legales = frame[10 + largo]
+        return {"tipo": RESULTADO_DADO,
+                "data": {"jugador": frame[10:10 + largo].decode("utf-8"),
+                         "valor": frame[8],
+                         "id_sala": id_sala,
+                         "legales": [i for i in range(4) if legales >> i & 1]}}
+
+    if codigo == COD_FICHAS_DELTA:
+        cambios = [[COLORES[frame[i] >> 2], frame[i] & 3, _DE_BYTE[frame[i + 1]]]
+                   for i in range(12, len(frame), 2)]
+        return {"tipo": FICHAS_DELTA,
+                "data": {"id_sala": id_sala, "seq": _SEQ.unpack_from(frame, 8)[0],
+                         "cambios": cambios}}
+
+    raise ValueError(f"codigo binario desconocido: {codigo}")
@@ -2,14 +2,19 @@ import socket
 import threading
 import json
 
+import codec
+from framer import LineFramer
+from protocol import FORMATO_BINARIO
+
 
 class NetworkClient:
-    def __init__(self, host, port, on_message_callback):
+    def __init__(self, host, port, on_message_callback, formato=FORMATO_BINARIO):
         self.host = host
         self.port = port
         self.sock = None
         self.connected = False
         self.on_message_callback = on_message_callback
+        self.formato = formato      # se pide al servidor en el LOGIN
 
     def conectar(self):
         try:
@@ -26,7 +31,8 @@ class NetworkClient:
             return False
 
     def hilo_receptor(self):
-        buffer = ""
+        # el listado de partidas puede ser grande: limite holgado del lado cliente
+        framer = LineFramer(max_frame=8 * 1024 * 1024)
         try:
             while self.connected:
                 data = self.sock.recv(4096)
@@ -34,10 +40,10 @@ class NetworkClient:
                     print("Servidor desconectado")
                     break
 
-                buffer += data.decode("utf-8")
-
-                while "\n" in buffer:
-                    linea, buffer = buffer.split("\n", 1)
+                for linea in framer.alimentar(data):
+                    if codec.es_binario(linea):
+                        self.on_message_callback(codec.decodificar_binario(linea))
+                        continue
                     linea = linea.strip()
                     if linea:
                         try:
@@ -53,8 +59,18 @@ class NetworkClient:
     def enviar(self, msg):
         if not self.connected:
             return
+        if msg.get("tipo") == "LOGIN":
+            msg.setdefault("data", {})["formato"] = self.formato
+        elif msg.get("tipo") == "LOTE":
+            for m in msg["data"]["mensajes"]:
+                if m.get("tipo") == "LOGIN":
+                    m.setdefault("data", {})["formato"] = self.formato
         try:
             data = json.dumps(msg) + "\n"
             self.sock.sendall(data.encode("utf-8"))
         except:
             self.connected = False
+
+    def enviar_lote(self, mensajes):
+        # varios pedidos en un solo frame: no hay que esperar respuesta entre ellos
+        self.enviar({"tipo": "LOTE", "data": {"mensajes": list(mensajes)}})
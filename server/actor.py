@@ -0,0 +1,87 @@
+"""
+Cada sala es un actor: los mensajes que la tocan se encolan en su bandeja
+y se ejecutan de a uno, en orden de llegada. Dos mensajes de la misma sala
+nunca corren a la vez (turno, dado y fichas no necesitan lock) y salas
+distintas avanzan en paralelo sin ningun lock global.
+
+Sin pool, la bandeja la vacia el mismo hilo que encola: es lo que pasa en
+el motor async y en los trabajadores de shards, que ya son de un solo
+hilo. El motor de hilos llama a usar_pool() y las bandejas se vacian en
+un ThreadPoolExecutor compartido, asi el hilo lector de un cliente nunca
+se queda atendiendo la sala de otro.
+
+Lo que termina en otro hilo (p. ej. un bot que pensaba su jugada) vuelve
+con desde_otro_hilo(), que lo entrega al hilo donde viven las salas de
+ese motor (ver usar_reinyector).
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import connection
+import logs
+
+# mensajes que procesa un actor antes de ceder el hilo a otra sala
+MAX_POR_TURNO = 64
+
+_pool = None
+_reinyectar = None
+
+
+def usar_pool(max_hilos=None):
+    global _pool
+    _pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="sala")
+
+
+def usar_reinyector(funcion):
+    """funcion(f, *args) debe ejecutar f(*args) en el hilo de las salas."""
+    global _reinyectar
+    _reinyectar = funcion
+
+
+def desde_otro_hilo(funcion, *args):
+    if _reinyectar is None:
+        funcion(*args)      # con pool, Actor.enviar ya es seguro desde cualquier hilo
+    else:
+        _reinyectar(funcion, *args)
+
+
+class Actor:
+    def __init__(self):
+        self.bandeja = deque()          # (funcion, args)
+        self.lock = threading.Lock()    # solo protege bandeja y activo
+        self.activo = False             # alguien esta vaciando la bandeja
+
+    def enviar(self, funcion, *args):
+        with self.lock:
+            self.bandeja.append((funcion, args))
+            if self.activo:
+                return      # el que esta vaciando lo va a ver
+            self.activo = True
+        if _pool is None:
+            self._vaciar()
+        else:
+            _pool.submit(self._vaciar)
+
+    def _vaciar(self):
+        while self._turno():
+            if _pool is not None:
+                # quedan mensajes: volver a la cola del pool para no acaparar el hilo
+                _pool.submit(self._vaciar)
+                return
+
+    def _turno(self):
+        """Procesa hasta MAX_POR_TURNO mensajes. Devuelve True si quedan mas."""
+        # los envios de todo el turno salen juntos (ver connection.tick)
+        with connection.tick():
+            for _ in range(MAX_POR_TURNO):
+                with self.lock:
+                    if not self.bandeja:
+                        self.activo = False
+                        return False
+                    funcion, args = self.bandeja.popleft()
+                try:
+                    funcion(*args)
+                except Exception:
+                    logs.error("error_sala", funcion=getattr(funcion, "__name__", funcion))
+        return True
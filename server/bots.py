@@ -0,0 +1,200 @@
+"""
+Jugadores bot para completar salas.
+
+Un bot ocupa un asiento como cualquier cliente_info, con un SockBot que
+no envia nada, y siempre esta listo. Cuando le toca, el actor de la sala
+tira el dado por el. Si hay una sola jugada la hace ahi mismo. Si hay
+varias, la eleccion se piensa en un pool chico aparte (MAX_HILOS) con
+simulaciones Monte Carlo sobre game.Tablero, cortadas a TIEMPO_POR_JUGADA,
+y el resultado vuelve al actor de la sala para aplicarse.
+
+Con muchas decisiones en cola el presupuesto de cada una se reparte, asi
+los bots juegan peor pero no se atrasan.
+
+Con arrancar_relleno() las salas nuevas que despues de un rato sigan con
+asientos libres se completan solas con bots (--bots-tras en server.py).
+"""
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import actor
+import logs
+from game import COLORES, BASE, EN_META, CAMINO_LEN, OFFSET_COLOR
+from protocol import FORMATO_JSON
+
+TIEMPO_POR_JUGADA = 0.05    # segundos de simulacion por decision
+PROFUNDIDAD = 12            # turnos que se juegan al azar en cada simulacion
+MAX_HILOS = 2
+
+_pool = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="bot")
+_numeros = itertools.count(1)
+_pendientes = 0
+_pendientes_lock = threading.Lock()
+
+ESPERA_RELLENO = None       # segundos; None = las salas solo esperan humanos
+_agenda = deque()           # (instante, sala), en orden porque la espera es fija
+_agenda_cond = threading.Condition()
+
+
+class SockBot:
+    """Los bots (y los asientos restaurados sin jugador) no tienen conexion:
+    lo que se les envia se pierde."""
+    formato = FORMATO_JSON
+
+    def enviar(self, data, clave=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def nuevo_bot(nombre=None, ocupados=()):
+    # ocupados: nombres ya en la sala; tras un reinicio el contador vuelve a 1
+    # y una sala restaurada puede tener ya un "Bot 1"
+    while nombre is None or nombre in ocupados:
+        nombre = f"Bot {next(_numeros)}"
+    return {"sock": SockBot(), "nombre": nombre, "sala_id": None, "bot": True}
+
+
+# ---------------- eleccion de jugada ----------------
+
+def _progreso(pieza, codigo):
+    # casillas avanzadas desde la salida de su color
+    if codigo == BASE:
+        return 0
+    if codigo < EN_META:
+        return 1 + (codigo - 1 - OFFSET_COLOR[COLORES[pieza >> 2]]) % CAMINO_LEN
+    return 1 + CAMINO_LEN + (codigo - EN_META)
+
+
+def _evaluar(tablero, color):
+    puntos = [0, 0, 0, 0]
+    for pieza, codigo in enumerate(tablero.pos):
+        puntos[pieza >> 2] += _progreso(pieza, codigo)
+    propio = COLORES.index(color)
+    rivales = [p for i, p in enumerate(puntos) if i != propio]
+    return puntos[propio] - sum(rivales) / len(rivales)
+
+
+def _simular(tablero, color, rnd):
+    # juega PROFUNDIDAD turnos al azar empezando por el color siguiente
+    turno = COLORES.index(color) + 1
+    for _ in range(PROFUNDIDAD):
+        actual = COLORES[turno % 4]
+        turno += 1
+        pasos = rnd.randint(1, 6)
+        legales = tablero.movimientos_legales(actual, pasos)
+        if not legales:
+            continue
+        pieza = tablero.pieza(actual, rnd.choice(legales))
+        tablero.mover(pieza, tablero.destino(pieza, pasos))
+        if tablero.gano(actual):
+            return 1e6 if actual == color else -1e6
+    return _evaluar(tablero, color)
+
+
+def elegir_movimiento(tablero, color, pasos, legales, presupuesto=TIEMPO_POR_JUGADA):
+    """Indice de ficha con mejor promedio de simulaciones dentro del presupuesto."""
+    rnd = random.Random()
+    despues = {}
+    for indice in legales:
+        copia = tablero.copiar()
+        pieza = copia.pieza(color, indice)
+        copia.mover(pieza, copia.destino(pieza, pasos))
+        if copia.gano(color):
+            return indice
+        despues[indice] = copia
+
+    totales = dict.fromkeys(legales, 0.0)
+    rondas = 0
+    limite = time.perf_counter() + presupuesto
+    while rondas == 0 or time.perf_counter() < limite:
+        for indice, inicial in despues.items():
+            totales[indice] += _simular(inicial.copiar(), color, rnd)
+        rondas += 1
+    return max(legales, key=totales.__getitem__)
+
+
+# ---------------- turno del bot (corre en el actor de la sala) ----------------
+
+def jugar_turno(sala, bot):
+    if sala.cerrada or sala.terminada or sala.jugador_actual() is not bot:
+        return
+    sala.tirar_dado(bot)
+    if sala.jugador_actual() is not bot or not sala.legales:
+        return      # no tenia jugada y el turno ya paso
+
+    color = sala.color_de_jugador(bot)
+    if len(sala.legales) == 1:
+        sala.mover_ficha(color, sala.legales[0])
+        return
+
+    global _pendientes
+    with _pendientes_lock:
+        _pendientes += 1
+        presupuesto = TIEMPO_POR_JUGADA * MAX_HILOS / max(MAX_HILOS, _pendientes)
+    futuro = _pool.submit(elegir_movimiento, sala.tablero.copiar(), color,
+                          sala.ultimo_dado, list(sala.legales), presupuesto)
+
+    def listo(futuro):
+        global _pendientes
+        with _pendientes_lock:
+            _pendientes -= 1
+        try:
+            indice = futuro.result()
+        except Exception:
+            logs.error("error_bot", sala=sala.id, color=color)
+            indice = None
+        actor.desde_otro_hilo(sala.actor.enviar, _aplicar, sala, bot, indice)
+
+    futuro.add_done_callback(listo)
+
+
+# ---------------- relleno de salas ----------------
+
+def arrancar_relleno(espera, rellenar):
+    """rellenar(sala) corre en el actor de cada sala nueva, espera segundos despues de crearla."""
+    global ESPERA_RELLENO
+    ESPERA_RELLENO = espera
+    threading.Thread(target=_hilo_relleno, args=(rellenar,), daemon=True).start()
+
+
+def programar_relleno(sala):
+    if ESPERA_RELLENO is None:
+        return
+    with _agenda_cond:
+        _agenda.append((time.monotonic() + ESPERA_RELLENO, sala))
+        _agenda_cond.notify()
+
+
+def _hilo_relleno(rellenar):
+    while True:
+        with _agenda_cond:
+            while not _agenda or _agenda[0][0] > time.monotonic():
+                _agenda_cond.wait(_agenda[0][0] - time.monotonic() if _agenda else None)
+            _, sala = _agenda.popleft()
+        if not sala.cerrada:
+            actor.desde_otro_hilo(sala.actor.enviar, rellenar, sala)
+
+
+def retomar(sala):
+    """Tras restaurar una sala: si le tocaba a un bot, que siga."""
+    bot = sala.jugador_actual()
+    if not bot or not bot.get("bot"):
+        return
+    if sala.legales:
+        _aplicar(sala, bot, None)     # ya habia tirado: lo que pensaba se perdio
+    else:
+        jugar_turno(sala, bot)
+
+
+def _aplicar(sala, bot, indice):
+    if sala.cerrada or sala.jugador_actual() is not bot or not sala.legales:
+        return
+    if indice not in sala.legales:
+        indice = sala.legales[0]
+    sala.mover_ficha(sala.color_de_jugador(bot), indice)
@@ -0,0 +1,189 @@
+"""
+Conexiones con cola de salida acotada.
+
+Los handlers nunca escriben directo al socket: enviar() deja los bytes en
+la cola de la conexion y un escritor propio (hilo o tarea asyncio) la
+vacia. Asi un cliente lento no frena al que esta difundiendo.
+
+Cuando la cola se llena se aplica POLITICA:
+  - "descartar":   se pierde el mensaje nuevo
+  - "coalescer":   si ya hay pendiente uno del mismo tipo de estado, el
+                   nuevo lo reemplaza; si no, se descarta
+  - "desconectar": se cierra la conexion
+"""
+import asyncio
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import logs
+import metrics
+from protocol import FORMATO_JSON
+
+MAX_COLA = 256
+POLITICA = "coalescer"
+POLITICAS = ("descartar", "coalescer", "desconectar")
+
+# mensajes donde el mas nuevo deja obsoleto al anterior
+COALESCIBLES = {"ESTADO_SALA", "ESTADO_FICHAS", "CAMBIO_TURNO",
+                "PARTIDAS_DISPONIBLES"}
+
+
+_tick = threading.local()
+
+
+@contextmanager
+def tick():
+    """
+    Agrupa los envios hechos dentro del bloque: las conexiones tocadas se
+    despiertan una sola vez al salir, asi su escritor junta todo lo
+    pendiente en un unico envio.
+    """
+    if getattr(_tick, "tocadas", None) is not None:
+        yield           # anidado: manda el bloque de afuera
+        return
+    _tick.tocadas = tocadas = {}
+    try:
+        yield
+    finally:
+        _tick.tocadas = None
+        for conn in tocadas.values():
+            conn._despertar()
+
+
+class _ColaSalida:
+    def __init__(self, cliente_info=None):
+        self.cliente_info = cliente_info    # dueño, para los logs del escritor
+        self.pendientes = deque()      # (clave, bytes)
+        self.cerrada = False
+        self.descartados = 0
+        self.formato = FORMATO_JSON     # lo puede cambiar el LOGIN
+
+    def _encolar(self, data, clave):
+        """Devuelve True si hay algo nuevo que escribir."""
+        if self.cerrada:
+            return False
+        if len(self.pendientes) < MAX_COLA:
+            self.pendientes.append((clave, data))
+            metrics.sumar(("mensajes_out", clave))
+            return True
+
+        if POLITICA == "desconectar":
+            self.close()
+            metrics.sumar("desconectados_por_cola")
+            return False
+
+        metrics.sumar("descartados")
+        if POLITICA == "coalescer" and clave in COALESCIBLES:
+            for i, (clave_vieja, _) in enumerate(self.pendientes):
+                if clave_vieja == clave:
+                    del self.pendientes[i]
+                    self.pendientes.append((clave, data))
+                    self.descartados += 1
+                    return True
+
+        self.descartados += 1
+        return False
+
+    def _tomar_lote(self):
+        lote = b"".join(data for _, data in self.pendientes)
+        self.pendientes.clear()
+        return lote
+
+    def _avisar(self):
+        tocadas = getattr(_tick, "tocadas", None)
+        if tocadas is None:
+            self._despertar()
+        else:
+            tocadas[id(self)] = self
+
+
+class SocketConnection(_ColaSalida):
+    """Socket bloqueante con un hilo escritor propio (motor de hilos)."""
+
+    def __init__(self, sock, cliente_info=None):
+        super().__init__(cliente_info)
+        self.sock = sock
+        self.cond = threading.Condition()
+        threading.Thread(target=self._hilo_escritor, daemon=True).start()
+
+    def enviar(self, data, clave=None):
+        with self.cond:
+            encolado = self._encolar(data, clave)
+        if encolado:
+            self._avisar()
+
+    def _despertar(self):
+        with self.cond:
+            self.cond.notify()
+
+    def _hilo_escritor(self):
+        while True:
+            with self.cond:
+                while not self.pendientes and not self.cerrada:
+                    self.cond.wait()
+                if self.cerrada:
+                    return
+                lote = self._tomar_lote()
+            try:
+                self.sock.sendall(lote)
+                metrics.sumar("bytes_enviados", len(lote))
+            except OSError as e:
+                metrics.sumar("errores_envio")
+                logs.warning("error_envio", self.cliente_info, error=e)
+                self.close()
+                return
+
+    def close(self):
+        with self.cond:
+            if self.cerrada:
+                return
+            self.cerrada = True
+            self.cond.notify()
+        try:
+            # despierta al recv del hilo lector
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class StreamConnection(_ColaSalida):
+    """StreamWriter de asyncio con una tarea escritora (motor async)."""
+
+    def __init__(self, writer, cliente_info=None):
+        super().__init__(cliente_info)
+        self.writer = writer
+        self.hay_datos = asyncio.Event()
+        self.tarea = asyncio.get_running_loop().create_task(self._escritor())
+
+    def enviar(self, data, clave=None):
+        if self._encolar(data, clave):
+            self._avisar()
+
+    def _despertar(self):
+        self.hay_datos.set()
+
+    async def _escritor(self):
+        try:
+            while True:
+                await self.hay_datos.wait()
+                self.hay_datos.clear()
+                if self.cerrada:
+                    return
+                lote = self._tomar_lote()
+                self.writer.write(lote)
+                metrics.sumar("bytes_enviados", len(lote))
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            metrics.sumar("errores_envio")
+            logs.warning("error_envio", self.cliente_info, error=e)
+            self.close()
+
+    def close(self):
+        if self.cerrada:
+            return
+        self.cerrada = True
+        self.hay_datos.set()
+        self.writer.close()
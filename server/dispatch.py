@@ -0,0 +1,70 @@
+"""
+Registro de handlers por tipo de mensaje.
+
+Cada handler recibe (cliente_info, data, sock) y se registra con
+
+    from dispatch import registrar
+
+    @registrar("MI_TIPO")
+    def manejar_mi_tipo(cliente_info, data, sock):
+        ...
+
+Asi un modulo aparte (ver --plugin en server.py) puede agregar tipos de
+mensaje nuevos sin tocar server.py. El despacho es una busqueda en un
+dict y cada llamada suma su duracion al histograma handler_ms de su tipo
+(ver metrics.py).
+
+Los mensajes que tocan una sala se registran con de_sala=True; su handler
+recibe ademas la sala ya resuelta (o None si no existe) y corre dentro
+del actor de esa sala (ver actor.py):
+
+    @registrar("MI_TIPO", de_sala=True)
+    def manejar_mi_tipo(sala, cliente_info, data, sock):
+        ...
+"""
+import time
+
+import metrics
+
+
+class Dispatcher:
+    def __init__(self):
+        self.handlers = {}
+        self.de_sala = set()    # tipos que corren en el actor de su sala
+
+    def registrar(self, tipo, de_sala=False):
+        def decorador(funcion):
+            self.handlers[tipo] = funcion
+            if de_sala:
+                self.de_sala.add(tipo)
+            else:
+                self.de_sala.discard(tipo)
+            return funcion
+        return decorador
+
+    def es_de_sala(self, tipo):
+        return tipo in self.de_sala
+
+    def despachar(self, tipo, *args):
+        """Ejecuta el handler de 'tipo'. Devuelve False si no hay ninguno."""
+        handler = self.handlers.get(tipo)
+        if handler is None:
+            return False
+
+        inicio = time.perf_counter_ns()
+        try:
+            handler(*args)
+        finally:
+            metrics.observar(("handler_ms", tipo), (time.perf_counter_ns() - inicio) / 1e6)
+        return True
+
+    def estadisticas(self):
+        por_tipo = metrics.resumen()["histogramas"].get("handler_ms", {})
+        return {
+            tipo: {"llamadas": h["n"], "promedio_ms": h["promedio"], "max_ms": h["max"]}
+            for tipo, h in por_tipo.items()
+        }
+
+
+despachador = Dispatcher()
+registrar = despachador.registrar
@@ -0,0 +1,93 @@
+"""
+Registro de eventos de las salas, en binario y solo agregando al final.
+
+Cada evento es un registro fijo de 12 bytes:
+
+    tipo (1) | a (1) | b (1) | c (1) | id_sala (4) | valor (4, big endian)
+
+  CREAR    valor = semilla del dado de la sala
+  UNIR     a = asiento, b = 1 si es bot
+  SALIR    a = asiento
+  LISTO    a = asiento, b = listo
+  INICIAR
+  DADO     a = asiento, b = valor del dado
+  MOVER    a = ficha (color * 4 + indice), b = destino (codificacion de game.Tablero)
+  TURNO    a = turno_idx
+  CERRAR
+  FIN      a = asiento del ganador
+  RESTAURAR  a = turno_idx, b = estado (bit 0 iniciada, bit 1 terminada),
+             c = listos (un bit por asiento), valor = dados ya tirados
+  COLOCAR  a = ficha, b = posicion; sin capturas (fichas de una foto restaurada)
+  REEMPLAZAR  a = asiento, b = 1 si el nuevo ocupante es bot (mismo asiento y color)
+
+Una sala restaurada de un snapshot se vuelve a anotar desde CREAR y UNIR,
+seguida de RESTAURAR y un COLOCAR por cada ficha fuera de la base.
+
+anotar() solo empaqueta y encola; un hilo escribe a disco en lotes cada
+INTERVALO segundos. Sin abrir() (--eventlog en server.py) no hace nada.
+Para reconstruir salas desde el archivo ver replay.py.
+"""
+import atexit
+import struct
+import threading
+import time
+from collections import deque
+
+REGISTRO = struct.Struct(">BBBB4sI")
+
+E_CREAR = 1
+E_UNIR = 2
+E_SALIR = 3
+E_LISTO = 4
+E_INICIAR = 5
+E_DADO = 6
+E_MOVER = 7
+E_TURNO = 8
+E_CERRAR = 9
+E_FIN = 10
+E_RESTAURAR = 11
+E_COLOCAR = 12
+E_REEMPLAZAR = 13
+
+INTERVALO = 0.05
+
+_log = None
+
+
+class EventLog:
+    def __init__(self, ruta):
+        self.archivo = open(ruta, "ab")
+        self.pendientes = deque()       # registros ya empaquetados
+        self.lock = threading.Lock()    # el hilo y atexit no escriben a la vez
+        self.hilo = threading.Thread(target=self._escritor, daemon=True)
+        self.hilo.start()
+        atexit.register(self.vaciar)    # lo que quedo del ultimo INTERVALO
+
+    def _escritor(self):
+        while True:
+            time.sleep(INTERVALO)
+            self.vaciar()
+
+    def vaciar(self):
+        pendientes = self.pendientes
+        with self.lock:
+            lote = []
+            try:
+                while True:
+                    lote.append(pendientes.popleft())
+            except IndexError:
+                pass
+            if lote:
+                self.archivo.write(b"".join(lote))
+                self.archivo.flush()
+
+
+def abrir(ruta):
+    global _log
+    _log = EventLog(ruta)
+    return _log
+
+
+def anotar(tipo, id_sala, a=0, b=0, c=0, valor=0):
+    if _log is not None:
+        _log.pendientes.append(REGISTRO.pack(tipo, a, b, c, bytes.fromhex(id_sala), valor))
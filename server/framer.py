@@ -0,0 +1,58 @@
+"""
+Separador de mensajes por linea ("\n") sobre bytes.
+
+Se acumula en un bytearray y solo se busca el salto de linea en lo que
+acaba de llegar, asi cada byte se recorre una vez aunque un recv traiga
+muchos mensajes. Se decodifica por frame completo, de modo que un
+caracter UTF-8 partido entre dos recv no rompe nada.
+
+Un frame que empieza con MARCA_BINARIA no es una linea sino un mensaje
+del protocolo binario: marca + largo (2 bytes) + cuerpo. Se devuelve
+entero, con la cabecera, para que quien lo reciba lo distinga.
+"""
+
+MAX_FRAME = 64 * 1024
+MARCA_BINARIA = 0
+
+
+class FrameTooLargeError(ValueError):
+    pass
+
+
+class LineFramer:
+    def __init__(self, max_frame=MAX_FRAME):
+        self.buffer = bytearray()
+        self.max_frame = max_frame
+
+    def alimentar(self, data):
+        """Agrega lo recibido y devuelve la lista de frames completos (sin el "\\n")."""
+        buf = self.buffer
+        desde = len(buf)    # lo anterior ya se reviso y no tenia "\n"
+        buf += data
+
+        frames = []
+        inicio = 0
+        with memoryview(buf) as vista:
+            while inicio < len(buf):
+                if buf[inicio] == MARCA_BINARIA:
+                    if len(buf) - inicio < 3:
+                        break
+                    fin = inicio + 3 + (buf[inicio + 1] << 8 | buf[inicio + 2])
+                    if fin > len(buf):
+                        break
+                    frames.append(bytes(vista[inicio:fin]))
+                    inicio = desde = fin
+                    continue
+
+                fin = buf.find(b"\n", max(desde, inicio))
+                if fin < 0:
+                    break
+                frames.append(bytes(vista[inicio:fin]))
+                inicio = desde = fin + 1
+
+        if inicio:
+            del buf[:inicio]
+        if len(buf) > self.max_frame:
+            buf.clear()
+            raise FrameTooLargeError(f"frame de mas de {self.max_frame} bytes")
+        return frames
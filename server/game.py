@@ -21,6 +21,7 @@ def mover_en_meta(pos_actual, pasos):
     return nuevo if nuevo <= FIN_LEN else None
 
 def calcular_nueva_posicion(pos_actual, pasos, color):
+    # version original, sin entrada a la meta; el servidor usa TRANSICIONES
     # sale de base
     if pos_actual is None:
         if puede_salir_de_base(pasos):
@@ -39,3 +40,171 @@ def calcular_nueva_posicion(pos_actual, pasos, color):
         return ("fin", nuevo)
 
     return None
+
+
+# ---------------- tablero compacto ----------------
+#
+# Cada ficha es un entero 0..15 (color * 4 + indice, colores en el orden
+# de COLORES) y su posicion otro entero:
+#   BASE (0)                 en la base
+#   1 + casilla (1..52)      en el camino
+#   EN_META + n (53..59)     ("fin", n)
+
+COLORES = ("azul", "rojo", "amarillo", "verde")
+BASE = 0
+EN_META = 1 + CAMINO_LEN
+
+# posicion codificada <-> forma JSON (None | int | ("fin", n))
+_A_JSON = [None] + list(range(CAMINO_LEN)) + [("fin", n) for n in range(FIN_LEN + 1)]
+_DE_JSON = {pos: cod for cod, pos in enumerate(_A_JSON)}
+
+
+# ---------------- tablas de transicion ----------------
+#
+# TRANSICIONES[color][codigo * 7 + pasos] = codigo de destino, o NO_MUEVE.
+# Reglas:
+#   - de la base se sale con 1 o 6 a la casilla de salida del color
+#   - en el camino se cuentan las casillas avanzadas desde la salida; al
+#     pasar de la ultima (51) se entra a la meta: 52 avanzadas = ("fin", 1)
+#   - en la meta hay que llegar exacto a ("fin", FIN_LEN), que es coronar
+
+NO_MUEVE = 0xFF
+_PASOS = 7      # indices 0..6 por posicion; el 0 nunca se usa
+
+
+def _destino(color, codigo, pasos):
+    offset = OFFSET_COLOR[color]
+    if codigo == BASE:
+        return 1 + offset if puede_salir_de_base(pasos) else NO_MUEVE
+    if codigo < EN_META:
+        avanzadas = (codigo - 1 - offset) % CAMINO_LEN + pasos
+        if avanzadas < CAMINO_LEN:
+            return 1 + (offset + avanzadas) % CAMINO_LEN
+        n = avanzadas - CAMINO_LEN + 1
+    else:
+        n = codigo - EN_META + pasos
+    return EN_META + n if n <= FIN_LEN else NO_MUEVE
+
+
+TRANSICIONES = tuple(
+    bytes(_destino(color, codigo, pasos) if pasos else NO_MUEVE
+          for codigo in range(EN_META + FIN_LEN + 1) for pasos in range(_PASOS))
+    for color in COLORES
+)
+
+
+def verificar_tablas():
+    """
+    Diferencias entre TRANSICIONES y calcular_nueva_posicion en los casos
+    que la funcion original ya resolvia (todo menos la entrada a la meta).
+    """
+    diferencias = []
+    for color in COLORES:
+        tabla = TRANSICIONES[COLORES.index(color)]
+        for codigo, pos in enumerate(_A_JSON):
+            for pasos in range(1, _PASOS):
+                esperado = calcular_nueva_posicion(pos, pasos, color)
+                if isinstance(pos, int) and (pos - OFFSET_COLOR[color]) % CAMINO_LEN + pasos >= CAMINO_LEN:
+                    continue    # aqui la original daba la vuelta en vez de entrar a la meta
+                obtenido = tabla[codigo * _PASOS + pasos]
+                obtenido = None if obtenido == NO_MUEVE else _A_JSON[obtenido]
+                if obtenido != esperado:
+                    diferencias.append((color, pos, pasos, esperado, obtenido))
+    return diferencias
+
+
+def codificar_posicion(pos):
+    if isinstance(pos, list):
+        pos = tuple(pos)        # ["fin", n] tal como llega del JSON
+    return _DE_JSON[pos]
+
+
+class Tablero:
+    """
+    Las 16 fichas en un arreglo de enteros mas un indice casilla -> fichas
+    que la ocupan, asi las capturas no recorren las fichas rivales.
+    """
+    __slots__ = ("pos", "casillas")
+
+    def __init__(self):
+        self.pos = [BASE] * 16
+        # solo se indexa el camino: en base y meta no hay capturas
+        self.casillas = [[] for _ in range(EN_META)]
+
+    def copiar(self):
+        copia = Tablero.__new__(Tablero)
+        copia.pos = self.pos[:]
+        copia.casillas = [ocupantes[:] for ocupantes in self.casillas]
+        return copia
+
+    @staticmethod
+    def pieza(color, indice):
+        return COLORES.index(color) * 4 + indice
+
+    def destino(self, pieza, pasos):
+        """Posicion codificada a la que llega la ficha, o None si no puede moverse."""
+        destino = TRANSICIONES[pieza >> 2][self.pos[pieza] * _PASOS + pasos]
+        return None if destino == NO_MUEVE else destino
+
+    def movimientos_legales(self, color, pasos):
+        """Indices (0..3) de las fichas de 'color' que pueden moverse 'pasos'."""
+        c = COLORES.index(color)
+        tabla = TRANSICIONES[c]
+        pos = self.pos
+        return [i for i in range(4) if tabla[pos[c * 4 + i] * _PASOS + pasos] != NO_MUEVE]
+
+    def gano(self, color):
+        # las 4 fichas al final de la meta
+        primera = COLORES.index(color) * 4
+        return all(c == EN_META + FIN_LEN for c in self.pos[primera:primera + 4])
+
+    def mover(self, pieza, destino):
+        """Mueve la ficha y devuelve las fichas rivales capturadas (ya en base)."""
+        capturadas = []
+        if BASE < destino < EN_META:
+            color = pieza >> 2
+            ocupantes = self.casillas[destino]
+            capturadas = [p for p in ocupantes if p >> 2 != color]
+            for p in capturadas:
+                self._colocar(p, BASE)
+        self._colocar(pieza, destino)
+        return capturadas
+
+    def _colocar(self, pieza, destino):
+        actual = self.pos[pieza]
+        if BASE < actual < EN_META:
+            self.casillas[actual].remove(pieza)
+        if BASE < destino < EN_META:
+            self.casillas[destino].append(pieza)
+        self.pos[pieza] = destino
+
+    def cambio(self, pieza):
+        # [color, indice, posicion] como viaja en FICHAS_DELTA
+        return [COLORES[pieza >> 2], pieza & 3, _A_JSON[self.pos[pieza]]]
+
+    def a_json(self):
+        pos = [_A_JSON[c] for c in self.pos]
+        return {color: pos[i * 4:i * 4 + 4] for i, color in enumerate(COLORES)}
+
+    @classmethod
+    def desde_codigos(cls, pos):
+        # las 16 posiciones ya codificadas, en el orden de self.pos
+        tablero = cls()
+        for pieza, codigo in enumerate(pos):
+            tablero._colocar(pieza, codigo)
+        return tablero
+
+    @classmethod
+    def desde_json(cls, fichas):
+        tablero = cls()
+        for i, color in enumerate(COLORES):
+            for j, pos in enumerate(fichas[color]):
+                tablero._colocar(i * 4 + j, codificar_posicion(pos))
+        return tablero
+
+
+if __name__ == "__main__":
+    diferencias = verificar_tablas()
+    for d in diferencias:
+        print("distinto:", d)
+    print("tablas", "OK" if not diferencias else f"con {len(diferencias)} diferencias")
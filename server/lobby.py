@@ -0,0 +1,189 @@
+"""
+Listado del lobby (LISTAR_PARTIDAS) armado de antemano.
+
+Cada sala guarda su info_publica ya serializada a JSON, y cada respuesta
+que se arma queda guardada por consulta hasta que alguna sala cambie (la
+version sube en cada cambio). Asi preguntar muchas veces por el lobby
+cuando nada cambio no vuelve a serializar nada.
+
+LISTAR_PARTIDAS con data vacio responde como siempre, la lista completa.
+Si trae alguno de estos campos responde {"version", "total", "pagina",
+"partidas"}:
+
+  modo          solo salas de ese modo
+  libres        con al menos tantos asientos libres
+  no_iniciadas  sin las partidas ya empezadas
+  pagina        desde 0, de a por_pagina salas (POR_PAGINA por defecto)
+  version       si el lobby sigue en esa version responde solo
+                {"version", "sin_cambios": true}
+
+SUSCRIBIR_LOBBY ({"activo": false} para dejar de estarlo) responde con un
+LOBBY_DIFF completo y desde ahi cada INTERVALO_DIFF segundos le llega al
+suscriptor un LOBBY_DIFF con lo que cambio: {"version", "completo",
+"salas" (nuevas o cambiadas), "quitadas" (ids)}. Varios cambios de una
+sala entre dos envios viajan como uno solo, y a quien todavia no termino
+de recibir el anterior se le junta todo en el siguiente. Suscriptores en
+la misma version comparten el mismo mensaje ya serializado.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import connection
+import logs
+
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+MAX_RESPUESTAS = 64         # consultas distintas guardadas por version
+INTERVALO_DIFF = 0.25
+
+_CAMPOS = ("modo", "libres", "no_iniciadas", "pagina", "por_pagina", "version")
+
+
+class LobbyCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.salas = {}         # id_sala -> info_publica
+        self.fragmentos = {}    # id_sala -> info_publica en JSON (bytes)
+        self.respuestas = {}    # consulta -> mensaje completo, vale para self.version
+        self.suscriptores = {}  # sock -> ultima version que se le envio
+        self.diario = OrderedDict()     # id_sala -> version de su ultimo cambio, de viejo a nuevo
+
+    def actualizar(self, id_sala, info):
+        """info = None saca la sala."""
+        with self.lock:
+            if info is None:
+                if self.salas.pop(id_sala, None) is None:
+                    return
+                del self.fragmentos[id_sala]
+            else:
+                if self.salas.get(id_sala) == info:
+                    return
+                self.salas[id_sala] = info
+                self.fragmentos[id_sala] = json.dumps(info).encode("utf-8")
+            self.version += 1
+            self.respuestas.clear()
+            if self.suscriptores:
+                self.diario[id_sala] = self.version
+                self.diario.move_to_end(id_sala)
+
+    def suscribir(self, sock):
+        """Bytes del LOBBY_DIFF completo con que arranca el suscriptor."""
+        with self.lock:
+            self.suscriptores[sock] = self.version
+            return self._diff(list(self.fragmentos), (), True)
+
+    def desuscribir(self, sock):
+        with self.lock:
+            self.suscriptores.pop(sock, None)
+
+    def diffs(self):
+        """[(bytes de LOBBY_DIFF, socks)] para los suscriptores que estan atrasados."""
+        with self.lock:
+            por_version = {}
+            for sock, version in self.suscriptores.items():
+                # sin cambios, o todavia tiene en cola lo anterior
+                if version != self.version and not sock.pendientes:
+                    por_version.setdefault(version, []).append(sock)
+
+            envios = []
+            for version, socks in por_version.items():
+                cambiadas = []
+                for id_sala in reversed(self.diario):
+                    if self.diario[id_sala] <= version:
+                        break
+                    cambiadas.append(id_sala)
+                salas = [i for i in cambiadas if i in self.fragmentos]
+                quitadas = [i for i in cambiadas if i not in self.fragmentos]
+                envios.append((self._diff(salas, quitadas, False), socks))
+                for sock in socks:
+                    self.suscriptores[sock] = self.version
+
+            # lo que ya vieron todos los suscriptores no hace falta guardarlo
+            minima = min(self.suscriptores.values(), default=self.version)
+            while self.diario and next(iter(self.diario.values())) <= minima:
+                self.diario.popitem(last=False)
+            return envios
+
+    def _diff(self, salas, quitadas, completo):
+        return (b'{"tipo": "LOBBY_DIFF", "data": {"version": %d, "completo": %s, '
+                b'"salas": [%s], "quitadas": %s}}\n'
+                % (self.version, b"true" if completo else b"false",
+                   b", ".join(self.fragmentos[i] for i in salas),
+                   json.dumps(list(quitadas)).encode("utf-8")))
+
+    def hilo_diffs(self, entregar):
+        # entregar(f, *args) corre f en el hilo que puede escribir en los socks
+        while True:
+            time.sleep(INTERVALO_DIFF)
+            try:
+                envios = self.diffs()
+                if envios:
+                    entregar(_enviar_diffs, envios)
+            except Exception:
+                logs.error("error_lobby")
+
+    def arrancar(self, entregar):
+        threading.Thread(target=self.hilo_diffs, args=(entregar,), daemon=True).start()
+
+    def responder(self, data):
+        """Bytes de PARTIDAS_DISPONIBLES para la consulta (el data del mensaje),
+        o None si la consulta no es valida."""
+        data = data or {}
+        if not isinstance(data, dict) or not isinstance(data.get("modo"), (str, type(None))):
+            return None     # modo va en la clave del cache: una lista ni siquiera es hashable
+        if not any(campo in data for campo in _CAMPOS):
+            consulta = None
+        else:
+            por_pagina = min(max(_entero(data.get("por_pagina"), POR_PAGINA), 1), MAX_POR_PAGINA)
+            consulta = (data.get("modo"), _entero(data.get("libres"), 0),
+                        bool(data.get("no_iniciadas")),
+                        max(_entero(data.get("pagina"), 0), 0), por_pagina)
+
+        with self.lock:
+            if consulta is not None and data.get("version") == self.version:
+                return _mensaje(b'{"version": %d, "sin_cambios": true}' % self.version)
+            respuesta = self.respuestas.get(consulta)
+            if respuesta is None:
+                respuesta = self._armar(consulta)
+                if len(self.respuestas) >= MAX_RESPUESTAS:
+                    self.respuestas.clear()
+                self.respuestas[consulta] = respuesta
+            return respuesta
+
+    def _armar(self, consulta):
+        if consulta is None:
+            return _mensaje(b"[" + b", ".join(self.fragmentos.values()) + b"]")
+
+        modo, libres, no_iniciadas, pagina, por_pagina = consulta
+        ids = [i for i, s in self.salas.items()
+               if (modo is None or s["modo"] == modo)
+               and s["max"] - s["jugadores"] >= libres
+               and not (no_iniciadas and s.get("iniciada"))]
+        desde = pagina * por_pagina
+        partidas = b", ".join(self.fragmentos[i] for i in ids[desde:desde + por_pagina])
+        return _mensaje(b'{"version": %d, "total": %d, "pagina": %d, "partidas": [%s]}'
+                        % (self.version, len(ids), pagina, partidas))
+
+
+def _enviar_diffs(envios):
+    with connection.tick():
+        for mensaje, socks in envios:
+            for sock in socks:
+                sock.enviar(mensaje, "LOBBY_DIFF")
+
+
+def _entero(valor, defecto):
+    try:
+        return int(valor) if valor is not None else defecto
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _mensaje(data):
+    return b'{"tipo": "PARTIDAS_DISPONIBLES", "data": ' + data + b"}\n"
+
+
+cache = LobbyCache()
@@ -0,0 +1,171 @@
+"""
+Logs estructurados que no frenan a los handlers.
+
+    logs.info("conexion", cliente_info)
+    logs.warning("error_envio", cliente_info, error=e)
+
+Cada registro lleva un evento, un nivel y campos sueltos; con cliente_info
+se agregan solos el jugador, la sala y la direccion. El hilo que loguea
+solo arma el LogRecord y lo mete con put_nowait en una cola acotada
+(MAX_COLA): si la cola esta llena el registro se descarta y se cuenta en
+la metrica logs_descartados, nunca se espera. Formatear y escribir lo
+hace un QueueListener en su propio hilo, a un archivo que rota
+(RotatingFileHandler, una linea JSON por registro) o a stderr en texto.
+
+Los eventos que se repiten mucho (errores de envio cuando se cae media
+sala, JSON invalido de un cliente roto) se muestrean: pasan a lo sumo
+POR_SEGUNDO por evento y por segundo, y el siguiente que pasa lleva en
+"suprimidos" cuantos se saltaron.
+
+Sin iniciar() (scripts que importan server, bench) no hay cola: se usa
+el logging por defecto de Python y solo salen warning y error.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+import metrics
+
+MAX_COLA = 10000
+POR_SEGUNDO = 20
+MAX_BYTES = 10 * 1024 * 1024
+ARCHIVOS = 5
+NIVELES = ("debug", "info", "warning", "error")
+
+_logger = logging.getLogger("parques")
+_listener = None
+_config = {}
+_ventanas = {}      # evento -> [segundo, pasaron, suprimidos]
+_ventanas_lock = threading.Lock()
+
+
+class _ColaHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no bloquea y no formatea en el hilo que loguea."""
+
+    def prepare(self, record):
+        # la cola no sale del proceso: el formato lo hace el listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.sumar("logs_descartados")
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        linea = {"ts": round(record.created, 3), "nivel": record.levelname.lower(),
+                 "evento": record.getMessage()}
+        linea.update(getattr(record, "campos", {}))
+        if record.exc_info:
+            linea["traza"] = self.formatException(record.exc_info)
+        return json.dumps(linea, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    def format(self, record):
+        campos = " ".join(f"{k}={v}" for k, v in getattr(record, "campos", {}).items())
+        linea = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname.lower():7} " \
+                f"{record.getMessage()} {campos}".rstrip()
+        if record.exc_info:
+            linea += "\n" + self.formatException(record.exc_info)
+        return linea
+
+
+def iniciar(ruta=None, nivel="info", max_bytes=MAX_BYTES, archivos=ARCHIVOS):
+    """Arranca el hilo escritor; con ruta, a archivos rotados en JSON."""
+    global _listener
+    detener()
+    _config.update(ruta=ruta, nivel=nivel, max_bytes=max_bytes, archivos=archivos)
+    if ruta:
+        destino = logging.handlers.RotatingFileHandler(
+            ruta, maxBytes=max_bytes, backupCount=archivos, encoding="utf-8")
+        destino.setFormatter(FormatoJSON())
+    else:
+        destino = logging.StreamHandler(sys.stderr)
+        destino.setFormatter(FormatoTexto())
+    cola = queue.Queue(MAX_COLA)
+    _logger.handlers[:] = [_ColaHandler(cola)]
+    _logger.setLevel(nivel.upper())
+    _logger.propagate = False
+    _listener = logging.handlers.QueueListener(cola, destino)
+    _listener.start()
+
+
+def detener():
+    """Vacia la cola y cierra el archivo."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for destino in _listener.handlers:
+            destino.close()
+        _listener = None
+
+
+atexit.register(detener)
+
+
+def configuracion():
+    """Lo que se paso a iniciar(), para repetirlo en otro proceso."""
+    return dict(_config)
+
+
+def _muestrear(evento):
+    # devuelve None si hay que saltar el registro, o cuantos se saltaron antes
+    ahora = int(time.monotonic())
+    with _ventanas_lock:
+        ventana = _ventanas.get(evento)
+        if ventana is None or ventana[0] != ahora:
+            suprimidos = ventana[2] if ventana else 0
+            _ventanas[evento] = [ahora, 1, 0]
+            return suprimidos
+        if ventana[1] >= POR_SEGUNDO:
+            ventana[2] += 1
+            return None
+        ventana[1] += 1
+        suprimidos, ventana[2] = ventana[2], 0
+        return suprimidos
+
+
+def registrar(nivel, evento, cliente_info=None, exc_info=False, **campos):
+    if not _logger.isEnabledFor(nivel):
+        return
+    suprimidos = _muestrear(evento)
+    if suprimidos is None:
+        metrics.sumar(("logs_suprimidos", evento))
+        return
+    if cliente_info is not None:
+        if cliente_info.get("nombre"):
+            campos.setdefault("jugador", cliente_info["nombre"])
+        if cliente_info.get("sala_id"):
+            campos.setdefault("sala", cliente_info["sala_id"])
+        if cliente_info.get("addr"):
+            campos.setdefault("addr", "%s:%s" % tuple(cliente_info["addr"][:2]))
+    if "error" in campos:
+        campos["error"] = str(campos["error"])
+    if suprimidos:
+        campos["suprimidos"] = suprimidos
+    _logger.log(nivel, evento, exc_info=exc_info, extra={"campos": campos})
+
+
+def debug(evento, cliente_info=None, **campos):
+    registrar(logging.DEBUG, evento, cliente_info, **campos)
+
+
+def info(evento, cliente_info=None, **campos):
+    registrar(logging.INFO, evento, cliente_info, **campos)
+
+
+def warning(evento, cliente_info=None, **campos):
+    registrar(logging.WARNING, evento, cliente_info, **campos)
+
+
+def error(evento, cliente_info=None, **campos):
+    # errores inesperados: con la traza de la excepcion que se esta manejando
+    registrar(logging.ERROR, evento, cliente_info, exc_info=True, **campos)
@@ -0,0 +1,72 @@
+"""
+Indice de salas con asientos libres para BUSCAR_PARTIDA.
+
+Por cada modo hay un balde por cantidad de asientos libres (1..MAX_LIBRES);
+cada balde es un dict id_sala -> None usado como conjunto ordenado. Buscar
+sala es mirar a lo sumo MAX_LIBRES baldes y sacar el primero: O(1) sin
+importar cuantas salas haya. Se prefieren las salas mas llenas, asi las
+partidas arrancan antes.
+
+Las salas avisan con actualizar() cada vez que cambia su ocupacion (o
+cuando dejan de aceptar jugadores: iniciada, terminada o cerrada). tomar()
+reserva el asiento restandolo del indice hasta que la sala vuelva a
+avisar con su ocupacion real.
+"""
+import threading
+
+MAX_LIBRES = 4
+
+
+class Pool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_modo = {}      # modo -> [balde por libres 0..MAX_LIBRES]
+        self.salas = {}         # id_sala -> (modo, libres)
+
+    def _baldes(self, modo):
+        baldes = self.por_modo.get(modo)
+        if baldes is None:
+            baldes = self.por_modo[modo] = [{} for _ in range(MAX_LIBRES + 1)]
+        return baldes
+
+    def _sacar(self, id_sala):
+        actual = self.salas.pop(id_sala, None)
+        if actual is not None:
+            modo, libres = actual
+            del self.por_modo[modo][libres][id_sala]
+
+    def _poner(self, id_sala, modo, libres):
+        libres = min(libres, MAX_LIBRES)
+        if libres > 0:
+            self._baldes(modo)[libres][id_sala] = None
+            self.salas[id_sala] = (modo, libres)
+
+    def actualizar(self, id_sala, modo, libres):
+        """libres = 0 saca la sala del indice."""
+        with self.lock:
+            self._sacar(id_sala)
+            self._poner(id_sala, modo, libres)
+
+    def quitar(self, id_sala):
+        with self.lock:
+            self._sacar(id_sala)
+
+    def tomar(self, modo, excluir=()):
+        """id de una sala con lugar para un jugador mas (ya reservado), o None.
+
+        excluir: salas que ya rechazaron a este jugador en esta busqueda.
+        """
+        with self.lock:
+            baldes = self.por_modo.get(modo)
+            if baldes is None:
+                return None
+            for libres in range(1, MAX_LIBRES + 1):
+                for id_sala in baldes[libres]:
+                    if id_sala not in excluir:
+                        self._sacar(id_sala)
+                        self._poner(id_sala, modo, libres - 1)
+                        return id_sala
+            return None
+
+
+pool = Pool()
@@ -0,0 +1,231 @@
+"""
+Metricas del servidor en memoria, baratas para dejarlas siempre prendidas.
+
+Cada hilo suma en sus propios dicts (threading.local), sin locks: sumar()
+y observar() son un par de operaciones de dict. Solo resumen() recorre los
+hilos y junta los numeros; lo de hilos que ya terminaron se pliega en un
+acumulado aparte para no perderlo. Eso tambien pasa cuando se registra un
+hilo nuevo y la lista crecio al doble desde la ultima poda, asi con un
+hilo por conexion la lista no crece sin limite aunque nadie pida STATS.
+
+  sumar(nombre, n)         contador
+  observar(nombre, valor)  histograma con los limites de LIMITES[nombre]
+                           (LIMITES_MS si no tiene)
+  medidor(nombre, f)       valor que se calcula al pedir el resumen
+                           (conexiones, salas por estado, colas...)
+
+nombre es un str o (str, etiqueta), p. ej. ("mensajes_in", "LOGIN").
+
+Se consultan con el mensaje STATS y, con --metricas PUERTO, en
+http://127.0.0.1:PUERTO/ en texto plano (formato de Prometheus).
+"""
+import threading
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LIMITES_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+LIMITES = {
+    "difusion_destinos": (1, 2, 4, 8, 16, 64, 256, 1024, 4096),
+}
+
+_local = threading.local()
+_hilos = []                     # (weakref al hilo, contadores, histogramas)
+_hilos_lock = threading.Lock()
+_retirados = ({}, {})           # lo de hilos que ya terminaron
+_medidores = {}
+MIN_PODA = 64
+_proxima_poda = MIN_PODA        # largo de _hilos que dispara la proxima poda
+
+
+def _propios():
+    # primera metrica de este hilo: sus dicts quedan registrados
+    global _proxima_poda
+    contadores, histogramas = _local.dicts = ({}, {})
+    with _hilos_lock:
+        _hilos.append((weakref.ref(threading.current_thread()), contadores, histogramas))
+        if len(_hilos) >= _proxima_poda:
+            _podar()
+            _proxima_poda = max(MIN_PODA, 2 * len(_hilos))
+    return contadores, histogramas
+
+
+def _podar():
+    # con _hilos_lock tomado: pliega en _retirados lo de los hilos que terminaron
+    vivos = []
+    for registro in _hilos:
+        ref, c, hs = registro
+        hilo = ref()
+        if hilo is not None and hilo.is_alive():
+            vivos.append(registro)
+            continue
+        for nombre, n in c.items():
+            _retirados[0][nombre] = _retirados[0].get(nombre, 0) + n
+        for nombre, h in hs.items():
+            _sumar_histograma(_retirados[1], nombre, h)
+    _hilos[:] = vivos
+
+
+def sumar(nombre, n=1):
+    try:
+        contadores = _local.dicts[0]
+    except AttributeError:
+        contadores = _propios()[0]
+    contadores[nombre] = contadores.get(nombre, 0) + n
+
+
+def observar(nombre, valor):
+    try:
+        histogramas = _local.dicts[1]
+    except AttributeError:
+        histogramas = _propios()[1]
+    clase = nombre[0] if isinstance(nombre, tuple) else nombre
+    limites = LIMITES.get(clase, LIMITES_MS)
+    h = histogramas.get(nombre)
+    if h is None:
+        # un balde por limite, uno para lo que se pasa, suma y maximo
+        h = histogramas[nombre] = [0] * (len(limites) + 3)
+    h[bisect_left(limites, valor)] += 1
+    h[-2] += valor
+    if valor > h[-1]:
+        h[-1] = valor
+
+
+def medidor(nombre, funcion):
+    _medidores[nombre] = funcion
+
+
+def _sumar_histograma(destino, nombre, h):
+    actual = destino.get(nombre)
+    if actual is None:
+        destino[nombre] = list(h)
+        return
+    for i in range(len(h) - 1):
+        actual[i] += h[i]
+    actual[-1] = max(actual[-1], h[-1])
+
+
+def _juntar():
+    with _hilos_lock:
+        _podar()
+        contadores = dict(_retirados[0])
+        histogramas = {n: list(h) for n, h in _retirados[1].items()}
+        for _, c, hs in _hilos:
+            # copy() de un dict es atomica con el GIL aunque su hilo siga sumando
+            for nombre, n in c.copy().items():
+                contadores[nombre] = contadores.get(nombre, 0) + n
+            for nombre, h in hs.copy().items():
+                _sumar_histograma(histogramas, nombre, list(h))
+    return contadores, histogramas
+
+
+def _limites(nombre):
+    return LIMITES.get(nombre[0] if isinstance(nombre, tuple) else nombre, LIMITES_MS)
+
+
+def _percentil(nombre, h, p):
+    # limite superior del balde donde cae el percentil (el maximo si se pasa)
+    total = sum(h[:-2])
+    if not total:
+        return 0
+    limites = _limites(nombre)
+    objetivo = total * p / 100
+    acumulado = 0
+    for i, n in enumerate(h[:-2]):
+        acumulado += n
+        if acumulado >= objetivo:
+            return limites[i] if i < len(limites) else h[-1]
+    return h[-1]
+
+
+def _agrupar(pares):
+    # {"x": 1, ("y", "A"): 2} -> {"x": 1, "y": {"A": 2}}
+    salida = {}
+    for nombre, valor in pares:
+        if isinstance(nombre, tuple):
+            salida.setdefault(nombre[0], {})[nombre[1]] = valor
+        else:
+            salida[nombre] = valor
+    return salida
+
+
+def resumen():
+    """Todas las metricas en un dict listo para JSON."""
+    contadores, histogramas = _juntar()
+    medidas = []
+    for nombre, funcion in list(_medidores.items()):
+        try:
+            medidas.append((nombre, funcion()))
+        except Exception as e:
+            medidas.append((nombre, f"error: {e}"))
+    resumidos = []
+    for nombre, h in sorted(histogramas.items(), key=lambda x: str(x[0])):
+        n = sum(h[:-2])
+        resumidos.append((nombre, {
+            "n": n, "promedio": h[-2] / n if n else 0, "max": h[-1],
+            "p50": _percentil(nombre, h, 50), "p95": _percentil(nombre, h, 95),
+            "p99": _percentil(nombre, h, 99),
+        }))
+    return {
+        "medidores": _agrupar(medidas),
+        "contadores": _agrupar(sorted(contadores.items(), key=lambda x: str(x[0]))),
+        "histogramas": _agrupar(resumidos),
+    }
+
+
+def _nombre_texto(nombre, sufijo="", *extra):
+    # ("mensajes_in", "LOGIN") -> parques_mensajes_in{tipo="LOGIN"}
+    etiquetas = list(extra)
+    if isinstance(nombre, tuple):
+        clave = "estado" if nombre[0] == "salas" else "tipo"
+        etiquetas.insert(0, f'{clave}="{nombre[1]}"')
+        nombre = nombre[0]
+    return f"parques_{nombre}{sufijo}" + ("{" + ",".join(etiquetas) + "}" if etiquetas else "")
+
+
+def texto():
+    """Las metricas en el formato de texto de Prometheus."""
+    contadores, histogramas = _juntar()
+    lineas = []
+    for nombre, funcion in sorted(_medidores.items(), key=lambda x: str(x[0])):
+        try:
+            valor = funcion()
+        except Exception:
+            continue
+        if isinstance(valor, dict):
+            for etiqueta, v in sorted(valor.items()):
+                lineas.append(f"{_nombre_texto((nombre, etiqueta))} {v}")
+        else:
+            lineas.append(f"{_nombre_texto(nombre)} {valor}")
+    for nombre, n in sorted(contadores.items(), key=lambda x: str(x[0])):
+        lineas.append(f"{_nombre_texto(nombre)} {n}")
+    for nombre, h in sorted(histogramas.items(), key=lambda x: str(x[0])):
+        acumulado = 0
+        for limite, n in zip(_limites(nombre) + ("+Inf",), h[:-2]):
+            acumulado += n
+            le = f'le="{limite}"'
+            lineas.append(f"{_nombre_texto(nombre, '_bucket', le)} {acumulado}")
+        lineas.append(f"{_nombre_texto(nombre, '_sum')} {h[-2]}")
+        lineas.append(f"{_nombre_texto(nombre, '_count')} {acumulado}")
+    return "\n".join(lineas) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        cuerpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass    # sin una linea por cada consulta
+
+
+def servir_http(puerto, host="127.0.0.1"):
+    """Atiende GET en host:puerto con texto(), en un hilo aparte."""
+    http = ThreadingHTTPServer((host, puerto), _Handler)
+    http.daemon_threads = True
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    return http
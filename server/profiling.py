@@ -0,0 +1,163 @@
+"""
+Perfilador por muestreo para ver en que se va el tiempo de los mensajes.
+
+Un hilo aparte mira cada INTERVALO las pilas de todos los hilos con
+sys._current_frames() y cuenta las que estan trabajando: procesando una
+linea (JSON, despacho, handler), vaciando la bandeja de una sala,
+escribiendo a un socket o pensando la jugada de un bot. Los hilos que
+esperan en recv, en una Condition o en el select del event loop no
+cuentan. Si la pila pasa por Dispatcher.despachar, la muestra se
+atribuye al tipo de mensaje (y a la sala, con por_sala) leyendo las
+variables de ese frame, asi el servidor no hace nada distinto mientras
+no se perfila: apagado cuesta cero.
+
+Para mirar las pilas el muestreador necesita el GIL, y el hilo que trabaja
+lo suelta por su cuenta justo al quedarse esperando: las muestras caerian
+casi todas en la espera. Mientras se perfila se baja el switch interval
+(SWITCH) para que el interprete le quite el GIL en medio del trabajo; eso
+cuesta algo de rendimiento y se restaura al detener.
+
+Al detener se escribe un archivo en formato "collapsed" (una pila por
+linea, frames separados por ";" y la cantidad de muestras al final), el
+que leen flamegraph.pl y speedscope:
+
+    LANZAR_DADO;_turno (actor.py:72);...;tirar_dado (server.py:244) 31
+
+Se prende y apaga con el mensaje PERFIL ({"accion": "iniciar" | "detener"
+| "estado", "intervalo_ms", "por_sala"}) o mandando SIGUSR2 al proceso
+(con --shards, a cada trabajador por su pid).
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+INTERVALO = 0.005
+SWITCH = 0.0002
+
+# funciones que son trabajo si estan en cualquier parte de la pila
+TRABAJO = {"procesar_linea", "manejar_mensaje", "_vaciar", "_turno", "_escritor",
+           "elegir_movimiento", "empaquetar_sala", "_enviar_diffs"}
+# el escritor de hilos espera en Condition.wait: cuenta solo si es la hoja (sendall)
+TRABAJO_HOJA = {"_hilo_escritor"}
+
+_perfil = None
+_lock = threading.RLock()     # la señal puede llegar con el lock tomado en el mismo hilo
+
+
+def _etiqueta(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Muestreador:
+    def __init__(self, intervalo=INTERVALO, por_sala=False):
+        self.intervalo = intervalo
+        self.por_sala = por_sala
+        self.pilas = Counter()
+        self.muestras = 0
+        self.archivo = os.path.abspath(
+            f"perfil-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        self.parar = threading.Event()
+        self.hilo = threading.Thread(target=self._correr, name="perfil", daemon=True)
+        self.switch = sys.getswitchinterval()
+
+    def _raiz(self, frame):
+        # tipo de mensaje (y sala) sacados del frame de Dispatcher.despachar
+        try:
+            variables = frame.f_locals
+            tipo = variables.get("tipo")
+            args = variables.get("args") or ()
+        except Exception:
+            return ["?"]
+        raiz = [str(tipo)]
+        if self.por_sala:
+            sala = args[0] if args and hasattr(args[0], "actor") else None
+            raiz.append(f"sala {sala.id}" if sala is not None else "sin sala")
+        return raiz
+
+    def _muestra(self, frame):
+        codes = []
+        raiz = None
+        trabajo = frame.f_code.co_name in TRABAJO_HOJA
+        while frame is not None:
+            code = frame.f_code
+            codes.append(code)
+            if code.co_name in TRABAJO:
+                trabajo = True
+            elif (raiz is None and code.co_name == "despachar"
+                  and code.co_filename.endswith("dispatch.py")):
+                raiz = self._raiz(frame)
+            frame = frame.f_back
+        if not trabajo:
+            return None
+        pila = raiz or ["(fuera de handler)"]
+        pila.extend(_etiqueta(c) for c in reversed(codes))
+        return ";".join(p.replace(";", ",") for p in pila)
+
+    def _correr(self):
+        propio = threading.get_ident()
+        sys.setswitchinterval(min(self.switch, SWITCH))
+        try:
+            while not self.parar.wait(self.intervalo):
+                for ident, frame in sys._current_frames().items():
+                    if ident == propio:
+                        continue
+                    pila = self._muestra(frame)
+                    if pila is not None:
+                        self.pilas[pila] += 1
+                self.muestras += 1
+        finally:
+            sys.setswitchinterval(self.switch)
+        self.escribir()
+
+    def escribir(self):
+        with open(self.archivo, "w", encoding="utf-8") as f:
+            for pila, n in self.pilas.most_common():
+                f.write(f"{pila} {n}\n")
+
+    def estado(self):
+        return {"activo": not self.parar.is_set(), "muestras": self.muestras,
+                "pilas": len(self.pilas), "archivo": self.archivo}
+
+
+def iniciar(intervalo=INTERVALO, por_sala=False):
+    global _perfil
+    with _lock:
+        if _perfil is None or _perfil.parar.is_set():
+            _perfil = Muestreador(intervalo, por_sala)
+            _perfil.hilo.start()
+        return _perfil.estado()
+
+
+def detener(esperar=True):
+    """Para el muestreo; el archivo lo escribe el hilo del muestreador al salir."""
+    with _lock:
+        perfil = _perfil
+        if perfil is None:
+            return {"activo": False}
+        perfil.parar.set()
+    if esperar:
+        perfil.hilo.join()
+    return perfil.estado()
+
+
+def estado():
+    perfil = _perfil
+    return perfil.estado() if perfil is not None else {"activo": False}
+
+
+def alternar(*_):
+    # desde la señal: no se espera al hilo, que escribe el archivo solo
+    if _perfil is not None and not _perfil.parar.is_set():
+        actual = detener(esperar=False)
+        print("Perfil detenido, se escribe en", actual["archivo"])
+    else:
+        actual = iniciar()
+        print("Perfil iniciado, se va a escribir en", actual["archivo"])
+
+
+def instalar_senal():
+    if hasattr(signal, "SIGUSR2"):
+        signal.signal(signal.SIGUSR2, alternar)
@@ -8,6 +8,12 @@ CREAR_PARTIDA = "CREAR_PARTIDA"
 PARTIDA_CREADA = "PARTIDA_CREADA"
 
 UNIR_PARTIDA = "UNIR_PARTIDA"
+BUSCAR_PARTIDA = "BUSCAR_PARTIDA"
+SUSCRIBIR_LOBBY = "SUSCRIBIR_LOBBY"
+LOBBY_DIFF = "LOBBY_DIFF"
+STATS = "STATS"
+PERFIL = "PERFIL"
+AGREGAR_BOT = "AGREGAR_BOT"
 UNIDO_A_PARTIDA = "UNIDO_A_PARTIDA"
 
 CHAT_GENERAL = "MENSAJE_GENERAL"
@@ -17,12 +23,27 @@ CAMBIAR_LISTO = "CAMBIAR_LISTO"
 ESTADO_SALA = "ESTADO_SALA"
 
 INICIAR_PARTIDA = "INICIAR_PARTIDA"
+REANUDAR_PARTIDA = "REANUDAR_PARTIDA"
 CAMBIO_TURNO = "CAMBIO_TURNO"
+FIN_PARTIDA = "FIN_PARTIDA"
 
 LANZAR_DADO = "LANZAR_DADO"
 RESULTADO_DADO = "RESULTADO_DADO"
 
 MOVER_FICHA = "MOVER_FICHA"
 ESTADO_FICHAS = "ESTADO_FICHAS"
+FICHAS_DELTA = "FICHAS_DELTA"
+PEDIR_FICHAS = "PEDIR_FICHAS"
 
 ERROR = "ERROR"
+
+# ---- protocolo binario (opcional, se negocia en LOGIN con "formato") ----
+
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "binario"
+
+# codigo numerico por tipo de mensaje, primer byte del cuerpo binario
+COD_ESTADO_FICHAS = 1
+COD_CAMBIO_TURNO = 2
+COD_RESULTADO_DADO = 3
+COD_FICHAS_DELTA = 4
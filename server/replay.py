@@ -0,0 +1,148 @@
+"""
+Reconstruye el estado final de las salas a partir de uno o mas archivos
+de eventlog (uno por proceso si se corrio con --shards).
+
+    python replay.py eventos.log
+    python replay.py eventos.log.0 eventos.log.1 --sala 1a2b3c4d --verificar
+
+--verificar vuelve a generar cada dado con la semilla de la sala y avisa
+si alguno no coincide con el registrado.
+"""
+import argparse
+import json
+import random
+import time
+
+import eventlog
+from eventlog import (E_CREAR, E_UNIR, E_SALIR, E_LISTO, E_INICIAR, E_DADO,
+                      E_MOVER, E_TURNO, E_CERRAR, E_FIN, E_RESTAURAR, E_COLOCAR,
+                      E_REEMPLAZAR)
+from game import Tablero
+
+
+class SalaReconstruida:
+    __slots__ = ("id", "semilla", "rng", "bots", "listos", "iniciada", "terminada",
+                 "turno_idx", "tablero", "dados", "cerrada", "ganador")
+
+    def __init__(self, id_sala, semilla):
+        self.id = id_sala
+        self.semilla = semilla
+        self.rng = random.Random(semilla)
+        self.bots = []          # por asiento: True si es bot
+        self.listos = []
+        self.iniciada = False
+        self.terminada = False
+        self.turno_idx = 0
+        self.tablero = Tablero()
+        self.dados = 0
+        self.cerrada = False
+        self.ganador = None     # asiento
+
+    def resumen(self):
+        return {
+            "id": self.id,
+            "semilla": self.semilla,
+            "jugadores": len(self.bots),
+            "bots": sum(self.bots),
+            "iniciada": self.iniciada,
+            "terminada": self.terminada,
+            "cerrada": self.cerrada,
+            "turno_idx": self.turno_idx,
+            "ganador": self.ganador,
+            "dados": self.dados,
+            "fichas": self.tablero.a_json(),
+        }
+
+
+def reconstruir(datos, solo_sala=None, verificar=False):
+    """datos: bytes de un eventlog. Devuelve (salas, eventos, dados que no coinciden)."""
+    salas = {}
+    distintos = []
+    filtro = bytes.fromhex(solo_sala) if solo_sala else None
+    fin = len(datos) - len(datos) % eventlog.REGISTRO.size
+    eventos = 0
+
+    for tipo, a, b, c, crudo, valor in eventlog.REGISTRO.iter_unpack(memoryview(datos)[:fin]):
+        eventos += 1
+        if filtro is not None and crudo != filtro:
+            continue
+
+        if tipo == E_MOVER:
+            sala = salas[crudo]
+            sala.tablero.mover(a, b)
+        elif tipo == E_DADO:
+            sala = salas[crudo]
+            sala.dados += 1
+            if verificar and sala.rng.randint(1, 6) != b:
+                distintos.append((sala.id, sala.dados))
+        elif tipo == E_TURNO:
+            salas[crudo].turno_idx = a
+        elif tipo == E_CREAR:
+            salas[crudo] = SalaReconstruida(crudo.hex(), valor)
+        elif tipo == E_UNIR:
+            sala = salas[crudo]
+            sala.bots.append(bool(b))
+            sala.listos.append(False)
+        elif tipo == E_LISTO:
+            salas[crudo].listos[a] = bool(b)
+        elif tipo == E_SALIR:
+            sala = salas[crudo]
+            sala.bots.pop(a)
+            sala.listos.pop(a)
+            # lo mismo que GameRoom.eliminar_jugador, que no anota TURNO
+            if a < sala.turno_idx:
+                sala.turno_idx -= 1
+            if sala.bots:
+                sala.turno_idx %= len(sala.bots)
+        elif tipo == E_INICIAR:
+            salas[crudo].iniciada = True
+        elif tipo == E_CERRAR:
+            salas[crudo].cerrada = True
+        elif tipo == E_FIN:
+            sala = salas[crudo]
+            sala.terminada = True
+            sala.ganador = a
+        elif tipo == E_RESTAURAR:
+            # la sala se volvio a crear desde un snapshot: seguir desde la foto
+            sala = salas[crudo]
+            sala.turno_idx = a
+            sala.iniciada = bool(b & 1)
+            sala.terminada = bool(b & 2)
+            sala.listos = [bool(c >> i & 1) for i in range(len(sala.listos))]
+            sala.dados = valor
+            if verificar:
+                for _ in range(valor):
+                    sala.rng.randint(1, 6)
+        elif tipo == E_COLOCAR:
+            salas[crudo].tablero._colocar(a, b)
+        elif tipo == E_REEMPLAZAR:
+            salas[crudo].bots[a] = bool(b)
+
+    return salas, eventos, distintos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye salas desde el eventlog")
+    parser.add_argument("archivos", nargs="+")
+    parser.add_argument("--sala", help="id de una sola sala")
+    parser.add_argument("--verificar", action="store_true",
+                        help="comprobar los dados contra la semilla de cada sala")
+    args = parser.parse_args()
+
+    for ruta in args.archivos:
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        inicio = time.perf_counter()
+        salas, eventos, distintos = reconstruir(datos, args.sala, args.verificar)
+        segundos = time.perf_counter() - inicio
+
+        for sala in salas.values():
+            print(json.dumps(sala.resumen()))
+        print(f"{ruta}: {eventos} eventos, {len(salas)} salas, "
+              f"{eventos / segundos if segundos else 0:,.0f} eventos/s")
+        if args.verificar:
+            print("dados que no coinciden:", distintos or "ninguno")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,139 @@
+import argparse
+import asyncio
+import importlib
+import ipaddress
+import os
 import socket
+import sys
 import threading
 import json
 import uuid
 import random
 
-from game import calcular_nueva_posicion
+import actor
+import bots
+import codec
+import connection
+import eventlog
+import lobby
+import logs
+import matchmaking
+import metrics
+import profiling
+import snapshot
+from dispatch import despachador, registrar
+from connection import SocketConnection, StreamConnection
+from framer import LineFramer, FrameTooLargeError
+from game import BASE, Tablero
+from protocol import FORMATO_JSON, FORMATO_BINARIO
  
 
 HOST = "0.0.0.0"
 PORT = 5000
+BACKLOG_ASYNC = 1024
+
+FORMATOS = (FORMATO_JSON, FORMATO_BINARIO)
+MAX_LOTE = 32
 
 salas = {}
-salas_lock = threading.Lock()
+salas_lock = threading.Lock()   # solo altas y bajas en salas; cada sala es un actor
 clientes = []
 
 
+def codificar_json(data):
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def codificar(data, formato):
+    if formato == FORMATO_BINARIO:
+        msg = codec.codificar_binario(data)
+        if msg is not None:
+            return msg
+    return codificar_json(data)
+
+
 def enviar_json(sock, data):
     try:
-        msg = json.dumps(data) + "\n"
-        sock.sendall(msg.encode("utf-8"))
+        sock.enviar(codificar(data, sock.formato), data.get("tipo"))
     except Exception as e:
-        print("Error enviando:", e)
+        metrics.sumar("errores_envio")
+        logs.warning("error_envio", getattr(sock, "cliente_info", None),
+                     tipo=data.get("tipo"), error=e)
+
+
+def difundir(socks, data, binario=None):
+    # se serializa una sola vez por formato y se encola el mismo buffer a cada destinatario
+    # binario: frame ya armado para los clientes binarios
+    por_formato = {FORMATO_BINARIO: binario} if binario is not None else {}
+    tipo = data.get("tipo")
+    metrics.observar("difusion_destinos", len(socks))
+    for sock in socks:
+        try:
+            msg = por_formato.get(sock.formato)
+            if msg is None:
+                msg = por_formato[sock.formato] = codificar(data, sock.formato)
+            sock.enviar(msg, tipo)
+        except Exception as e:
+            metrics.sumar("errores_envio")
+            logs.warning("error_envio", getattr(sock, "cliente_info", None),
+                         tipo=tipo, error=e)
+
+def nuevo_id_sala():
+    return uuid.uuid4().hex[:8]
 
 CAMINO_LEN = 52
 FIN_LEN = 6
 
 class GameRoom:
-    def __init__(self, modo, creador_info):
-        self.id = uuid.uuid4().hex[:8]
+    def __init__(self, modo, creador_info, id_sala=None, semilla=None):
+        self.id = id_sala or nuevo_id_sala()
         self.modo = modo
+        # dado propio y reproducible: con la semilla del eventlog se repite la partida
+        self.semilla = random.getrandbits(32) if semilla is None else semilla
+        self.rng = random.Random(self.semilla)
+        self.dados = 0             # tiradas hechas con rng
+        eventlog.anotar(eventlog.E_CREAR, self.id, valor=self.semilla)
         self.jugadores = []        # lista de dicts cliente_info
         self.listos = []           # paralela a jugadores
         self.max_jugadores = 4
         self.turno_idx = 0
         self.agregar_jugador(creador_info)
         self.colores = ["azul", "rojo", "amarillo", "verde"]
-        self.fichas = {
-            "azul":    [None, None, None, None],
-            "rojo":    [None, None, None, None],
-            "amarillo":[None, None, None, None],
-            "verde":   [None, None, None, None],
-        }
+        self.tablero = Tablero()
         self.offset_color = {
             "azul": 0,
             "rojo": 13,
             "amarillo": 26,
             "verde": 39
         }
+        self.iniciada = False
+        self.terminada = False     # algún color coronó sus 4 fichas
         self.ultimo_dado = None
+        self.legales = []          # fichas que puede mover el dado actual
+        self.seq = 0               # sube con cada cambio en las fichas
+        # todo lo que lee o cambia el estado de la sala pasa por aqui
+        self.actor = actor.Actor()
+        self.cerrada = False       # se fue el ultimo jugador
 
         
 
     def agregar_jugador(self, cliente_info):
         # evitar duplicados por nombre
-        for j in self.jugadores:
+        for idx, j in enumerate(self.jugadores):
             if j["nombre"] == cliente_info["nombre"]:
-                return False
+                if not j.get("ausente"):
+                    return False
+                # vuelve a su asiento de antes del reinicio
+                self.jugadores[idx] = cliente_info
+                cliente_info["sala_id"] = self.id
+                return True
 
         if len(self.jugadores) < self.max_jugadores:
             self.jugadores.append(cliente_info)
             self.listos.append(False)
             cliente_info["sala_id"] = self.id
+            eventlog.anotar(eventlog.E_UNIR, self.id, len(self.jugadores) - 1,
+                            int(bool(cliente_info.get("bot"))))
             return True
         return False
 
@@ -69,6 +142,39 @@ class GameRoom:
             idx = self.jugadores.index(cliente_info)
             self.jugadores.pop(idx)
             self.listos.pop(idx)
+            eventlog.anotar(eventlog.E_SALIR, self.id, idx)
+            # que el turno siga apuntando al mismo jugador (o al siguiente)
+            if idx < self.turno_idx:
+                self.turno_idx -= 1
+            if self.jugadores:
+                self.turno_idx %= len(self.jugadores)
+
+    def agregar_bot(self):
+        bot = bots.nuevo_bot(ocupados=self.nombres())
+        if not self.agregar_jugador(bot):
+            return None
+        self.marcar_listo(len(self.jugadores) - 1, True)
+        return bot
+
+    def marcar_listo(self, idx, listo):
+        self.listos[idx] = listo
+        eventlog.anotar(eventlog.E_LISTO, self.id, idx, int(bool(listo)))
+
+    def reemplazar_por_bot(self, idx):
+        # el asiento (y su color) pasa a un bot, p. ej. el de un ausente que no volvió
+        bot = bots.nuevo_bot(ocupados=self.nombres())
+        bot["sala_id"] = self.id
+        self.jugadores[idx] = bot
+        eventlog.anotar(eventlog.E_REEMPLAZAR, self.id, idx, 1)
+        self.marcar_listo(idx, True)
+        return bot
+
+    def nombres(self):
+        return [j["nombre"] for j in self.jugadores]
+
+    def solo_bots(self):
+        # los asientos restaurados cuyo jugador no ha vuelto tampoco miran la partida
+        return all(j.get("bot") or j.get("ausente") for j in self.jugadores)
 
     def enviar_estado_sala(self):
         data = {
@@ -77,16 +183,62 @@ class GameRoom:
             "listos": self.listos,
             "faltan": self.listos.count(False)
         }
-        for p in self.jugadores:
-            enviar_json(p["sock"], {"tipo": "ESTADO_SALA", "data": data})
+        self.difundir({"tipo": "ESTADO_SALA", "data": data})
+
+    def difundir(self, data):
+        difundir([p["sock"] for p in self.jugadores if not p.get("bot")], data)
+
+    @property
+    def fichas(self):
+        # forma JSON: color -> [None | casilla | ("fin", n)] * 4
+        return self.tablero.a_json()
+
+    def estado_fichas(self):
+        return {
+            "tipo": "ESTADO_FICHAS",
+            "data": {"fichas": self.fichas, "seq": self.seq}
+        }
+
+    def enviar_fichas(self, socks):
+        # a los binarios van los códigos del tablero tal cual; la forma JSON
+        # (a_json) solo se arma si alguno la necesita
+        binario = codec.codificar_estado_fichas(self.tablero.pos, self.seq)
+        if all(s.formato == FORMATO_BINARIO for s in socks):
+            data = {"tipo": "ESTADO_FICHAS"}
+        else:
+            data = self.estado_fichas()
+        difundir(socks, data, binario)
+
+    def difundir_fichas(self, cambios):
+        # cambios: [color, indice, posicion] de cada ficha que se movió
+        self.seq += 1
+        humanos = [p for p in self.jugadores if not p.get("bot")]
+        con_deltas = [p["sock"] for p in humanos if p.get("deltas")]
+        sin_deltas = [p["sock"] for p in humanos if not p.get("deltas")]
+        if con_deltas:
+            difundir(con_deltas, {
+                "tipo": "FICHAS_DELTA",
+                "data": {"id_sala": self.id, "seq": self.seq, "cambios": cambios}
+            })
+        if sin_deltas:
+            self.enviar_fichas(sin_deltas)
 
     def info_publica(self):
         return {
             "id": self.id,
             "modo": self.modo,
             "jugadores": len(self.jugadores),
-            "max": self.max_jugadores
+            "max": self.max_jugadores,
+            "iniciada": self.iniciada
         }
+
+    def publicar(self):
+        # asientos libres en el índice de BUSCAR_PARTIDA (0 = ya no acepta)
+        # y la fila de la sala en el listado del lobby
+        abierta = not (self.iniciada or self.cerrada)
+        libres = self.max_jugadores - len(self.jugadores) if abierta else 0
+        matchmaking.pool.actualizar(self.id, self.modo, libres)
+        lobby.cache.actualizar(self.id, None if self.cerrada else self.info_publica())
     
     def jugador_actual(self):
         if not self.jugadores:
@@ -98,6 +250,126 @@ class GameRoom:
             return
         self.turno_idx = (self.turno_idx + 1) % len(self.jugadores)
 
+    def intentar_iniciar(self):
+        # si todos listos y hay 4 jugadores, iniciar partida y fijar turno
+        if self.iniciada or len(self.jugadores) != 4 or not all(self.listos):
+            return
+        self.iniciada = True
+        self.publicar()
+        self.turno_idx = 0  # empieza el primero en la lista
+        eventlog.anotar(eventlog.E_INICIAR, self.id)
+        self.difundir({
+            "tipo": "INICIAR_PARTIDA",
+            "data": {
+                "mensaje": "La partida va a comenzar",
+                "id_sala": self.id,
+                "jugador_actual": self.jugador_actual()["nombre"]
+            }
+        })
+        self.turno_de_bot()
+
+    def reanudar(self):
+        # todo lo que necesita quien vuelve a una partida en curso, en un mensaje
+        actual = self.jugador_actual()
+        data = {
+            "id_sala": self.id,
+            "jugadores": [j["nombre"] for j in self.jugadores],
+            "jugador_actual": actual["nombre"],
+            "fichas": self.fichas,
+            "seq": self.seq
+        }
+        if self.ultimo_dado is not None:
+            data["dado"] = {"jugador": actual["nombre"], "valor": self.ultimo_dado,
+                            "legales": self.legales}
+        return {"tipo": "REANUDAR_PARTIDA", "data": data}
+
+    def tirar_dado(self, jugador_info):
+        valor = self.rng.randint(1, 6)
+        self.dados += 1
+        eventlog.anotar(eventlog.E_DADO, self.id, self.jugadores.index(jugador_info), valor)
+
+        color = self.color_de_jugador(jugador_info)
+        legales = self.tablero.movimientos_legales(color, valor) if color else []
+
+        # avisar a todos el resultado y qué fichas se pueden mover con él
+        self.difundir({
+            "tipo": "RESULTADO_DADO",
+            "data": {
+                "jugador": jugador_info["nombre"],
+                "valor": valor,
+                "id_sala": self.id,
+                "legales": legales
+            }
+        })
+
+        if not legales:
+            # no hay jugada posible: pasa solo
+            self.pasar_turno()
+            return
+
+        self.ultimo_dado = valor
+        self.legales = legales
+
+    def mover_ficha(self, color, indice_ficha):
+        # indice_ficha tiene que estar en self.legales
+        tablero = self.tablero
+        pieza = tablero.pieza(color, indice_ficha)
+        destino = tablero.destino(pieza, self.ultimo_dado)
+
+        # aplicar movimiento; las rivales en la casilla de llegada vuelven a base
+        capturadas = tablero.mover(pieza, destino)
+        eventlog.anotar(eventlog.E_MOVER, self.id, pieza, destino)
+        cambios = [tablero.cambio(p) for p in capturadas]
+        cambios.append(tablero.cambio(pieza))
+
+        # solo las fichas que cambiaron (o el estado completo a clientes viejos)
+        self.difundir_fichas(cambios)
+        if tablero.gano(color):
+            self.terminar(self.jugador_actual())
+        else:
+            self.pasar_turno()
+
+    def terminar(self, ganador):
+        self.terminada = True
+        self.ultimo_dado = None
+        self.legales = []
+        eventlog.anotar(eventlog.E_FIN, self.id, self.turno_idx)
+        self.difundir({
+            "tipo": "FIN_PARTIDA",
+            "data": {
+                "id_sala": self.id,
+                "ganador": ganador["nombre"],
+                "color": self.color_de_jugador(ganador)
+            }
+        })
+
+    def pasar_turno(self):
+        # el dado se pierde y se avisa a todos quién sigue
+        self.ultimo_dado = None
+        self.legales = []
+        self.avanzar_turno()
+        self.anunciar_turno()
+
+    def anunciar_turno(self):
+        nuevo_actual = self.jugador_actual()
+        if not nuevo_actual:
+            return
+        eventlog.anotar(eventlog.E_TURNO, self.id, self.turno_idx)
+        self.difundir({
+            "tipo": "CAMBIO_TURNO",
+            "data": {
+                "id_sala": self.id,
+                "jugador_actual": nuevo_actual["nombre"]
+            }
+        })
+        self.turno_de_bot()
+
+    def turno_de_bot(self):
+        # como mensaje aparte en la bandeja, no recursivo
+        actual = self.jugador_actual()
+        if actual and actual.get("bot"):
+            self.actor.enviar(bots.jugar_turno, self, actual)
+
     def color_de_jugador(self, cliente_info):
         if cliente_info not in self.jugadores:
             return None
@@ -119,260 +391,599 @@ class GameRoom:
 
 
 
-def manejar_mensaje(cliente_info, msg, sock):
-    tipo = msg.get("tipo")
-    data = msg.get("data", {})
+@registrar("LOGIN")
+def manejar_login(cliente_info, data, sock):
+    nombre = data.get("nombre", "").strip()
+    if not nombre:
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Nombre inválido"}})
+        return
+    cliente_info["nombre"] = nombre
+    cliente_info["deltas"] = bool(data.get("deltas"))
+    formato = data.get("formato", FORMATO_JSON)
+    sock.formato = formato if formato in FORMATOS else FORMATO_JSON
+    enviar_json(sock, {"tipo": "LOGIN_OK",
+                    "data": {"nombre": nombre, "formato": sock.formato}})
+
+
+# CHAT GENERAL
+@registrar("MENSAJE_GENERAL")
+def manejar_chat_general(cliente_info, data, sock):
     nombre = cliente_info.get("nombre")
+    texto = data.get("texto", "")
+    if not nombre:
+        return  # ignoramos si no tiene login
+
+    respuesta = {
+        "tipo": "MENSAJE_GENERAL",
+        "data": {"autor": nombre, "texto": texto}
+    }
+    difundir([c["sock"] for c in clientes], respuesta)
+
+
+# CREAR SALA
+@registrar("CREAR_PARTIDA")
+def manejar_crear_partida(cliente_info, data, sock):
+    if en_partida(cliente_info):
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Ya estás en una partida"}})
+        return
+    sala = crear_sala(cliente_info, data.get("modo", "1v1v1v1"))
+    enviar_json(sock, {
+        "tipo": "PARTIDA_CREADA",
+        "data": sala.info_publica()
+    })
+
+
+def crear_sala(cliente_info, modo, id_sala=None):
+    sala = GameRoom(modo, cliente_info, id_sala=id_sala)
+    with salas_lock:
+        salas[sala.id] = sala
+    sala.publicar()
+    bots.programar_relleno(sala)
+    return sala
+
+
+# BUSCAR PARTIDA: entrar a la sala abierta más llena del modo, o abrir una
+MAX_REINTENTOS_BUSQUEDA = 3
+
+@registrar("BUSCAR_PARTIDA")
+def manejar_buscar_partida(cliente_info, data, sock, id_elegida=None):
+    # id_elegida: con --shards la elige el frontal (ver shards.py); nunca sale de data
+    if en_partida(cliente_info):
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Ya estás en una partida"}})
+        return
+    buscar_partida(cliente_info, data.get("modo", "1v1v1v1"), sock, id_elegida)
+
+
+def en_partida(cliente_info):
+    sala = salas.get(cliente_info["sala_id"]) if cliente_info["sala_id"] else None
+    return (sala is not None and not sala.cerrada and not sala.terminada
+            and cliente_info in sala.jugadores)
+
+
+def buscar_partida(cliente_info, modo, sock, id_elegida=None, descartadas=()):
+    if cliente_info.get("desconectado"):
+        return      # un reintento que llegó después de cerrarse la conexión
+    id_sala = id_elegida or matchmaking.pool.tomar(modo, excluir=descartadas)
+    sala = salas.get(id_sala) if id_sala else None
+
+    if sala is None:
+        sala = crear_sala(cliente_info, modo, id_elegida)
+        if cliente_info.get("desconectado"):
+            # desconectar_cliente miró antes de que la sala estuviera en salas
+            sala.actor.enviar(_salir_de_sala, sala, cliente_info)
+            return
+        # por el actor: otro que busque ya puede estar entrando a esta sala
+        sala.actor.enviar(anunciar_union, sala, sock)
+        return
 
-    # CHAT GENERAL
-    if tipo == "MENSAJE_GENERAL":
-        texto = data.get("texto", "")
-        if not nombre:
-            return  # ignoramos si no tiene login
+    sala.actor.enviar(_unir_buscada, sala, cliente_info, modo, sock,
+                      id_elegida, descartadas)
 
-        respuesta = {
-            "tipo": "MENSAJE_GENERAL",
-            "data": {"autor": nombre, "texto": texto}
-        }
-        for c in clientes:
-            enviar_json(c["sock"], respuesta)
 
-    # CREAR SALA
-    elif tipo == "CREAR_PARTIDA":
-        modo = data.get("modo", "1v1v1v1")
-        sala = GameRoom(modo, cliente_info)
-        with salas_lock:
-            salas[sala.id] = sala
+def _unir_buscada(sala, cliente_info, modo, sock, id_elegida, descartadas):
+    # corre en el actor de la sala elegida
+    unido = not sala.cerrada and not sala.iniciada and sentar(sala, cliente_info)
+    if sala.cerrada:
+        matchmaking.pool.quitar(sala.id)    # tomar() la habia vuelto a poner
+    else:
+        sala.publicar()     # confirma o devuelve la reserva de tomar()
+    if unido:
+        anunciar_union(sala, sock)
+    elif cliente_info.get("desconectado"):
+        return
+    elif id_elegida or len(descartadas) >= MAX_REINTENTOS_BUSQUEDA:
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "No se pudo entrar a una sala, busca otra vez"}})
+    else:
+        # se llenó, arrancó o ya hay alguien con ese nombre: buscar otra sin esta
+        buscar_partida(cliente_info, modo, sock, descartadas=descartadas + (sala.id,))
 
-        enviar_json(sock, {
-            "tipo": "PARTIDA_CREADA",
-            "data": sala.info_publica()
-        })
 
-    # LISTAR SALAS
-    elif tipo == "LISTAR_PARTIDAS":
-        with salas_lock:
-            lista = [s.info_publica() for s in salas.values()]
-        enviar_json(sock, {"tipo": "PARTIDAS_DISPONIBLES", "data": lista})
+def sentar(sala, cliente_info):
+    # corre en el actor: la conexión pudo cerrarse mientras el mensaje esperaba
+    if cliente_info.get("desconectado") or not sala.agregar_jugador(cliente_info):
+        return False
+    if cliente_info.get("desconectado"):
+        # se cerró justo ahora y desconectar_cliente no alcanzó a ver sala_id
+        _salir_de_sala(sala, cliente_info)
+        return False
+    return True
 
-    # UNIR SALA
-    elif tipo == "UNIR_PARTIDA":
-        id_sala = data.get("id_sala")
-        with salas_lock:
-            sala = salas.get(id_sala)
 
-        if sala is None:
-            enviar_json(sock, {"tipo": "ERROR",
-                            "data": {"mensaje": "Sala no existe"}})
-            return
+def anunciar_union(sala, sock):
+    if sala.iniciada:
+        # recuperó su asiento en una partida en curso: UNIDO_A_PARTIDA sacaría
+        # del tablero a los demás, que solo reciben ESTADO_SALA
+        enviar_json(sock, sala.reanudar())
+        sala.enviar_estado_sala()
+        return
+    data_sala = {
+        "id_sala": sala.id,
+        "jugadores": [j["nombre"] for j in sala.jugadores]
+    }
+    sala.difundir({"tipo": "UNIDO_A_PARTIDA", "data": data_sala})
+    sala.enviar_estado_sala()
+
+
+# LISTAR SALAS
+@registrar("LISTAR_PARTIDAS")
+def manejar_listar_partidas(cliente_info, data, sock):
+    # ya viene en JSON, que es como viaja en ambos formatos
+    respuesta = lobby.cache.responder(data)
+    if respuesta is None:
+        enviar_json(sock, {"tipo": "ERROR", "data": {"mensaje": "Consulta inválida"}})
+        return
+    try:
+        sock.enviar(respuesta, "PARTIDAS_DISPONIBLES")
+    except Exception as e:
+        metrics.sumar("errores_envio")
+        logs.warning("error_envio", cliente_info, tipo="PARTIDAS_DISPONIBLES", error=e)
 
-        if sala.agregar_jugador(cliente_info):
-            data_sala = {
-                "id_sala": sala.id,
-                "jugadores": [j["nombre"] for j in sala.jugadores]
-            }
-            for p in sala.jugadores:
-                enviar_json(p["sock"],
-                            {"tipo": "UNIDO_A_PARTIDA", "data": data_sala})
-            sala.enviar_estado_sala()
+
+@registrar("SUSCRIBIR_LOBBY")
+def manejar_suscribir_lobby(cliente_info, data, sock):
+    if data.get("activo", True):
+        sock.enviar(lobby.cache.suscribir(sock), "LOBBY_DIFF")
+    else:
+        lobby.cache.desuscribir(sock)
+
+
+# METRICAS: solo desde la misma maquina o con el token de administracion
+ADMIN_TOKEN = os.environ.get("PARQUES_ADMIN_TOKEN")
+
+
+def es_admin(cliente_info, data):
+    if ADMIN_TOKEN and data.get("token") == ADMIN_TOKEN:
+        return True
+    addr = cliente_info.get("addr")
+    try:
+        return bool(addr) and ipaddress.ip_address(addr[0]).is_loopback
+    except ValueError:
+        return False
+
+
+@registrar("STATS")
+def manejar_stats(cliente_info, data, sock):
+    if not es_admin(cliente_info, data):
+        enviar_json(sock, {"tipo": "ERROR", "data": {"mensaje": "No autorizado"}})
+        return
+    enviar_json(sock, {"tipo": "STATS", "data": metrics.resumen()})
+
+
+@registrar("PERFIL")
+def manejar_perfil(cliente_info, data, sock):
+    if not es_admin(cliente_info, data):
+        enviar_json(sock, {"tipo": "ERROR", "data": {"mensaje": "No autorizado"}})
+        return
+    accion = data.get("accion", "estado")
+    try:
+        if accion == "iniciar":
+            intervalo = float(data.get("intervalo_ms", profiling.INTERVALO * 1000)) / 1000
+            estado = profiling.iniciar(max(intervalo, 0.001), bool(data.get("por_sala")))
+        elif accion == "detener":
+            estado = profiling.detener()
         else:
-            enviar_json(sock, {"tipo": "ERROR",
-                            "data": {"mensaje": "Sala llena"}})
+            estado = profiling.estado()
+    except (TypeError, ValueError, OSError) as e:
+        enviar_json(sock, {"tipo": "ERROR", "data": {"mensaje": f"Perfil: {e}"}})
+        return
+    enviar_json(sock, {"tipo": "PERFIL", "data": estado})
+
+
+def _salas_por_estado():
+    with salas_lock:
+        vivas = list(salas.values())
+    estados = {"esperando": 0, "en_juego": 0, "terminada": 0}
+    for sala in vivas:
+        if sala.terminada:
+            estados["terminada"] += 1
+        elif sala.iniciada:
+            estados["en_juego"] += 1
+        else:
+            estados["esperando"] += 1
+    return estados
 
-    # CAMBIAR ESTADO LISTO
-    elif tipo == "CAMBIAR_LISTO":
-        id_sala = data.get("id_sala")
-        listo = data.get("listo", False)
 
-        with salas_lock:
-            sala = salas.get(id_sala)
+def _colas_salida():
+    return [len(getattr(c["sock"], "pendientes", ())) for c in list(clientes)]
+
 
-        if sala is None:
-            return
+def _bandejas_salas():
+    with salas_lock:
+        return [len(s.actor.bandeja) for s in salas.values()]
 
-        for idx, info in enumerate(sala.jugadores):
-            if info["sock"] == sock:
-                sala.listos[idx] = listo
-                break
 
-        sala.enviar_estado_sala()
+metrics.medidor("conexiones", lambda: len(clientes))
+metrics.medidor("salas", _salas_por_estado)
+metrics.medidor("cola_salida_total", lambda: sum(_colas_salida()))
+metrics.medidor("cola_salida_max", lambda: max(_colas_salida(), default=0))
+metrics.medidor("bandeja_salas_total", lambda: sum(_bandejas_salas()))
+metrics.medidor("bandeja_salas_max", lambda: max(_bandejas_salas(), default=0))
 
-        # si todos listos y hay 4 jugadores, iniciar partida y fijar turno
-        if sala.listos.count(True) == len(sala.jugadores) and len(sala.jugadores) == 4:
-            sala.turno_idx = 0  # empieza el primero en la lista
-            jugador_actual = sala.jugador_actual()["nombre"]
-
-            for p in sala.jugadores:
-                enviar_json(p["sock"], {
-                    "tipo": "INICIAR_PARTIDA",
-                    "data": {
-                        "mensaje": "La partida va a comenzar",
-                        "id_sala": sala.id,
-                        "jugador_actual": jugador_actual
-                    }
-                })
-
-    elif tipo == "TERMINAR_TURNO":
-        id_sala = data.get("id_sala")
 
-        with salas_lock:
-            sala = salas.get(id_sala)
+# UNIR SALA
+@registrar("UNIR_PARTIDA", de_sala=True)
+def manejar_unir_partida(sala, cliente_info, data, sock):
+    if sala is None:
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Sala no existe"}})
+        return
+    if en_partida(cliente_info):
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Ya estás en una partida"}})
+        return
 
-        if sala is None:
-            return
+    if sentar(sala, cliente_info):
+        sala.publicar()
+        anunciar_union(sala, sock)
+    elif not cliente_info.get("desconectado"):
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Sala llena"}})
 
-        # Solo puede terminar turno el jugador actual
-        jugador_actual_info = sala.jugador_actual()
-        if not jugador_actual_info or jugador_actual_info["sock"] is not sock:
-            # ignoramos si no es su turno
-            return
 
-        # avanzar turno
-        sala.avanzar_turno()
-        nuevo_actual = sala.jugador_actual()
-        if not nuevo_actual:
-            return
+# CAMBIAR ESTADO LISTO
+@registrar("CAMBIAR_LISTO", de_sala=True)
+def manejar_cambiar_listo(sala, cliente_info, data, sock):
+    listo = data.get("listo", False)
 
-        nombre_actual = nuevo_actual["nombre"]
+    if sala is None:
+        return
 
-        # Avisar a todos quién sigue
-        for p in sala.jugadores:
-            enviar_json(p["sock"], {
-                "tipo": "CAMBIO_TURNO",
-                "data": {
-                    "id_sala": sala.id,
-                    "jugador_actual": nombre_actual
-                }
-            })
+    for idx, info in enumerate(sala.jugadores):
+        if info["sock"] == sock:
+            sala.marcar_listo(idx, listo)
+            break
 
-    # CHAT DE SALA
-    elif tipo == "CHAT_SALA":
-        texto = data.get("texto", "")
-        id_sala = data.get("id_sala")
+    sala.enviar_estado_sala()
+    sala.intentar_iniciar()
 
-        with salas_lock:
-            sala = salas.get(id_sala)
 
-        if sala is None:
-            return
+# AGREGAR BOT: un jugador de la sala ocupa un asiento libre con un bot
+@registrar("AGREGAR_BOT", de_sala=True)
+def manejar_agregar_bot(sala, cliente_info, data, sock):
+    if sala is None or cliente_info not in sala.jugadores:
+        return
 
-        for p in sala.jugadores:
-            enviar_json(p["sock"], {
-                "tipo": "MENSAJE_SALA",
-                "data": {"autor": nombre, "texto": texto}
-            })
+    if sala.iniciada or sala.agregar_bot() is None:
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "No hay asientos libres"}})
+        return
+    anunciar_bots(sala)
 
-    elif tipo == "LANZAR_DADO":
-        id_sala = data.get("id_sala")
 
-        with salas_lock:
-            sala = salas.get(id_sala)
+def completar_con_bots(sala):
+    # corre en el actor: la sala lleva bots.ESPERA_RELLENO esperando jugadores
+    if sala.cerrada or sala.iniciada or sala.solo_bots():
+        return
+    agregados = 0
+    while sala.agregar_bot() is not None:
+        agregados += 1
+    if agregados:
+        anunciar_bots(sala)
 
-        if sala is None:
-            return
 
-        # validar que sea el jugador que tiene el turno
-        jugador_actual_info = sala.jugador_actual()
-        if not jugador_actual_info or jugador_actual_info["sock"] is not sock:
-            # ignorar intentos fuera de turno
-            return
+def anunciar_bots(sala):
+    sala.publicar()
+    sala.difundir({"tipo": "UNIDO_A_PARTIDA", "data": {
+        "id_sala": sala.id,
+        "jugadores": [j["nombre"] for j in sala.jugadores]
+    }})
+    sala.enviar_estado_sala()
+    sala.intentar_iniciar()
 
-        # generar número del dado
-        valor = random.randint(1, 6)
-
-        # avisar a todos el resultado
-        for p in sala.jugadores:
-            enviar_json(p["sock"], {
-                "tipo": "RESULTADO_DADO",
-                "data": {
-                    "jugador": jugador_actual_info["nombre"],
-                    "valor": valor,
-                    "id_sala": sala.id
-                }
-            })
 
-        sala.ultimo_dado = valor
+@registrar("TERMINAR_TURNO", de_sala=True)
+def manejar_terminar_turno(sala, cliente_info, data, sock):
+    if sala is None or sala.terminada:
+        return
 
-    elif tipo == "MOVER_FICHA":
-        id_sala = data.get("id_sala")
-        indice_ficha = data.get("indice_ficha", 0)
+    # Solo puede terminar turno el jugador actual
+    jugador_actual_info = sala.jugador_actual()
+    if not jugador_actual_info or jugador_actual_info["sock"] is not sock:
+        # ignoramos si no es su turno
+        return
 
-        with salas_lock:
-            sala = salas.get(id_sala)
+    # avanzar turno y avisar a todos quién sigue
+    sala.pasar_turno()
+
+
+# CHAT DE SALA
+@registrar("CHAT_SALA", de_sala=True)
+def manejar_chat_sala(sala, cliente_info, data, sock):
+    nombre = cliente_info.get("nombre")
+    texto = data.get("texto", "")
 
-        if sala is None:
-            return
+    if sala is None:
+        return
 
-        jugador_actual = sala.jugador_actual()
-        if not jugador_actual or jugador_actual["sock"] is not sock:
-            # no es tu turno
-            return
+    sala.difundir({
+        "tipo": "MENSAJE_SALA",
+        "data": {"autor": nombre, "texto": texto}
+    })
 
-        color = sala.color_de_jugador(cliente_info)
-        if color is None:
-            return
 
-        # valor de dado que vamos a usar
-        pasos = sala.ultimo_dado
-        if pasos is None:
-            return  # aún no ha tirado
+@registrar("LANZAR_DADO", de_sala=True)
+def manejar_lanzar_dado(sala, cliente_info, data, sock):
+    if sala is None or sala.terminada:
+        return
 
-        if not (0 <= indice_ficha < 4):
-            return
+    # validar que sea el jugador que tiene el turno
+    jugador_actual_info = sala.jugador_actual()
+    if not jugador_actual_info or jugador_actual_info["sock"] is not sock:
+        # ignorar intentos fuera de turno
+        return
 
-        pos_actual = sala.fichas[color][indice_ficha]
+    if sala.ultimo_dado is not None:
+        return  # ya tiró, le falta mover
 
+    sala.tirar_dado(jugador_actual_info)
 
-        nueva_pos = calcular_nueva_posicion(pos_actual, pasos, color)
-        if nueva_pos is None:
-            return
 
-        if isinstance(nueva_pos, int):
-            for color_rival, fichas_rival in sala.fichas.items():
-                if color_rival == color:
-                    continue
-                for i, pos_rival in enumerate(fichas_rival):
-                    if pos_rival == nueva_pos:
-                        # captura, devolver a base
-                        fichas_rival[i] = None
-
-        # aplicar movimiento
-        sala.fichas[color][indice_ficha] = nueva_pos
-
-        # nuevo estado de fichas
-        data_fichas = {
-            "fichas": sala.fichas
-        }
-        for p in sala.jugadores:
-            enviar_json(p["sock"], {
-                "tipo": "ESTADO_FICHAS",
-                "data": data_fichas
-            })
+@registrar("MOVER_FICHA", de_sala=True)
+def manejar_mover_ficha(sala, cliente_info, data, sock):
+    indice_ficha = data.get("indice_ficha", 0)
 
-        sala.ultimo_dado = None
-        sala.avanzar_turno()
-        nuevo_jugador = sala.jugador_actual()
-        if nuevo_jugador:
-            for p in sala.jugadores:
-                enviar_json(p["sock"], {
-                    "tipo": "CAMBIO_TURNO",
-                    "data": {
-                        "id_sala": sala.id,
-                        "jugador_actual": nuevo_jugador["nombre"]
-                    }
-                })
+    if sala is None or sala.terminada:
+        return
 
+    jugador_actual = sala.jugador_actual()
+    if not jugador_actual or jugador_actual["sock"] is not sock:
+        # no es tu turno
+        return
 
-    else:
+    color = sala.color_de_jugador(cliente_info)
+    if color is None:
+        return
+
+    # valor de dado que vamos a usar
+    pasos = sala.ultimo_dado
+    if pasos is None:
+        return  # aún no ha tirado
+
+    if indice_ficha not in sala.legales:
+        enviar_json(sock, {"tipo": "ERROR",
+                        "data": {"mensaje": "Esa ficha no se puede mover"}})
+        return
+
+    sala.mover_ficha(color, indice_ficha)
+
+
+# el cliente detectó un hueco en la secuencia de deltas
+@registrar("PEDIR_FICHAS", de_sala=True)
+def manejar_pedir_fichas(sala, cliente_info, data, sock):
+    if sala is None or cliente_info not in sala.jugadores:
+        return
+
+    sala.enviar_fichas([sock])
+
+
+def manejar_mensaje(cliente_info, msg, sock):
+    tipo = msg.get("tipo")
+    data = msg.get("data", {})
+
+    if despachador.es_de_sala(tipo):
+        sala = salas.get(data.get("id_sala"))
+        if sala is None:
+            # el handler decide si avisa o ignora
+            despachador.despachar(tipo, None, cliente_info, data, sock)
+        else:
+            sala.actor.enviar(_en_sala, tipo, sala, cliente_info, data, sock)
+        return
+
+    if not despachador.despachar(tipo, cliente_info, data, sock):
         enviar_json(sock, {
             "tipo": "ERROR",
             "data": {"mensaje": f"Tipo de mensaje desconocido: {tipo}"}
         })
 
 
+def _en_sala(tipo, sala, cliente_info, data, sock):
+    # corre dentro del actor: la sala pudo cerrarse mientras esto esperaba
+    despachador.despachar(tipo, None if sala.cerrada else sala,
+                          cliente_info, data, sock)
+
+
+def procesar_linea(cliente_info, linea, manejar=None):
+    linea = linea.strip()
+    if not linea:
+        return
+    try:
+        msg = json.loads(linea)
+    except ValueError as e:
+        metrics.sumar("json_invalido")
+        logs.warning("json_invalido", cliente_info, error=e)
+        return
+
+    if msg.get("tipo") == "LOTE":
+        # varios mensajes en un solo frame, se procesan en orden
+        mensajes = msg.get("data", {}).get("mensajes", [])
+        for m in mensajes[:MAX_LOTE]:
+            if isinstance(m, dict) and m.get("tipo") != "LOTE":
+                procesar_mensaje(cliente_info, m, manejar)
+        return
+
+    procesar_mensaje(cliente_info, msg, manejar)
+
+
+def procesar_mensaje(cliente_info, msg, manejar=None):
+    sock = cliente_info["sock"]
+    tipo = msg.get("tipo")
+    # los tipos desconocidos van juntos: no crear una etiqueta por cada invento
+    metrics.sumar(("mensajes_in", tipo if tipo in despachador.handlers else "desconocido"))
+    if tipo == "LOGIN":
+        # el login siempre se atiende en este proceso (también en el frontal)
+        despachador.despachar("LOGIN", cliente_info, msg.get("data", {}), sock)
+    else:
+        (manejar or manejar_mensaje)(cliente_info, msg, sock)
+
+
+def _salir_de_sala(sala, cliente_info):
+    # corre dentro del actor de la sala
+    if sala.cerrada or cliente_info not in sala.jugadores:
+        return
+    era_su_turno = sala.iniciada and sala.jugador_actual() is cliente_info
+    sala.eliminar_jugador(cliente_info)
+    if sala.solo_bots():
+        cerrar_sala(sala)
+        return
+    sala.publicar()
+
+    sala.enviar_estado_sala()
+    if era_su_turno:
+        sala.ultimo_dado = None
+        sala.legales = []
+        sala.anunciar_turno()
+
+
+def cerrar_sala(sala):
+    # corre en el actor: sin humanos la sala no tiene a quién mostrarle nada
+    sala.cerrada = True
+    sala.publicar()
+    eventlog.anotar(eventlog.E_CERRAR, sala.id)
+    with salas_lock:
+        salas.pop(sala.id, None)
+
+
+# segundos que un asiento restaurado espera a que su jugador vuelva
+ESPERA_AUSENTES = 120.0
+
+
+def restaurar_salas(ruta):
+    """Vuelve a crear las salas guardadas por snapshot en ruta."""
+    restauradas = []
+    for estado in snapshot.abrir(ruta):
+        asientos = []
+        for jugador in estado["jugadores"]:
+            if jugador["bot"]:
+                asientos.append(bots.nuevo_bot(jugador["nombre"]))
+            else:
+                # hasta que el jugador vuelva a unirse con el mismo nombre
+                asientos.append({"sock": bots.SockBot(), "nombre": jugador["nombre"],
+                                 "sala_id": None, "ausente": True})
+
+        sala = GameRoom(estado["modo"], asientos[0], id_sala=estado["id"],
+                        semilla=estado["semilla"])
+        for asiento in asientos[1:]:
+            sala.agregar_jugador(asiento)
+        sala.listos = [j["listo"] for j in estado["jugadores"]]
+        for _ in range(estado["dados"]):
+            sala.rng.randint(1, 6)     # el dado sigue donde iba
+        sala.dados = estado["dados"]
+        sala.iniciada = estado["iniciada"]
+        sala.terminada = estado["terminada"]
+        sala.turno_idx = estado["turno_idx"]
+        sala.ultimo_dado = estado["ultimo_dado"]
+        sala.legales = estado["legales"]
+        sala.seq = estado["seq"]
+        sala.tablero = Tablero.desde_codigos(estado["pos"])
+        anotar_restauracion(sala)
+
+        with salas_lock:
+            salas[sala.id] = sala
+        sala.publicar()
+        restauradas.append(sala)
+    return restauradas
+
+
+def anotar_restauracion(sala):
+    # GameRoom() ya anotó CREAR y UNIR; replay necesita ademas lo que trae la foto
+    eventlog.anotar(eventlog.E_RESTAURAR, sala.id, sala.turno_idx,
+                    sala.iniciada | sala.terminada << 1,
+                    sum(1 << i for i, listo in enumerate(sala.listos) if listo),
+                    sala.dados)
+    for pieza, codigo in enumerate(sala.tablero.pos):
+        if codigo != BASE:
+            eventlog.anotar(eventlog.E_COLOCAR, sala.id, pieza, codigo)
+
+
+def continuar_salas(restauradas, vencer=None):
+    # con el motor ya andando: los bots a los que les tocaba siguen jugando
+    # y las salas que esperaban jugadores vuelven a la agenda de --bots-tras
+    snapshot.arrancar(lambda: list(salas.values()))
+    for sala in restauradas:
+        if not sala.iniciada:
+            bots.programar_relleno(sala)
+        elif not sala.terminada:
+            sala.actor.enviar(bots.retomar, sala)
+    if restauradas:
+        temporizador = threading.Timer(ESPERA_AUSENTES, _vencer_ausentes,
+                                       (restauradas, vencer or vencer_ausentes))
+        temporizador.daemon = True
+        temporizador.start()
+
+
+def _vencer_ausentes(restauradas, vencer):
+    for sala in restauradas:
+        actor.desde_otro_hilo(sala.actor.enviar, vencer, sala)
+
+
+def vencer_ausentes(sala):
+    """Corre en el actor ESPERA_AUSENTES después de restaurar: los que no volvieron
+    dejan su asiento a un bot (partida en curso) o libre (sala esperando)."""
+    ausentes = [j for j in sala.jugadores if j.get("ausente")]
+    if sala.cerrada or not ausentes:
+        return
+    if sala.solo_bots():
+        cerrar_sala(sala)
+        return
+    le_tocaba = sala.jugador_actual() in ausentes
+    for ausente in ausentes:
+        if sala.iniciada:
+            sala.reemplazar_por_bot(sala.jugadores.index(ausente))
+        else:
+            sala.eliminar_jugador(ausente)
+    sala.publicar()
+    sala.enviar_estado_sala()
+    if sala.iniciada and not sala.terminada and le_tocaba:
+        # el turno estaba parado en un ausente: ahora lo juega su bot
+        bots.retomar(sala)
+
+
+def desconectar_cliente(cliente_info):
+    # antes de mirar sala_id: un UNIR_PARTIDA que siga en la bandeja de una
+    # sala ve la marca y no sienta a esta conexión (ver sentar)
+    cliente_info["desconectado"] = True
+    # salir de sala si estaba dentro
+    if cliente_info["sala_id"]:
+        sala = salas.get(cliente_info["sala_id"])
+        if sala:
+            sala.actor.enviar(_salir_de_sala, sala, cliente_info)
+
+    lobby.cache.desuscribir(cliente_info["sock"])
+    if cliente_info in clientes:
+        clientes.remove(cliente_info)
+
+
 def hilo_cliente(sock, addr):
-    cliente_info = {"sock": sock, "nombre": None, "sala_id": None}
-    buffer = ""
+    cliente_info = {"sock": None, "nombre": None, "sala_id": None, "addr": addr}
+    conn = cliente_info["sock"] = SocketConnection(sock, cliente_info)
+    metrics.sumar("conexiones_abiertas")
+    clientes.append(cliente_info)
+    framer = LineFramer()
+    logs.info("conexion", cliente_info)
 
     try:
         while True:
@@ -380,50 +991,70 @@ def hilo_cliente(sock, addr):
             if not data:
                 break
 
-            buffer += data.decode("utf-8")
-
-            while "\n" in buffer:
-                linea, buffer = buffer.split("\n", 1)
-                linea = linea.strip()
-                if not linea:
-                    continue
-                try:
-                    msg = json.loads(linea)
-                except json.JSONDecodeError as e:
-                    print("JSON inválido:", e)
-                    continue
-
-                if msg.get("tipo") == "LOGIN":
-                    nombre = msg.get("data", {}).get("nombre", "").strip()
-                    if not nombre:
-                        enviar_json(sock, {"tipo": "ERROR",
-                                        "data": {"mensaje": "Nombre inválido"}})
-                        continue
-                    cliente_info["nombre"] = nombre
-                    enviar_json(sock, {"tipo": "LOGIN_OK",
-                                    "data": {"nombre": nombre}})
-                else:
-                    manejar_mensaje(cliente_info, msg, sock)
+            # todo lo que responda este recv sale en un solo envio por destinatario
+            with connection.tick():
+                for linea in framer.alimentar(data):
+                    procesar_linea(cliente_info, linea)
 
-    except ConnectionResetError:
-        print("Conexion reseteada", addr)
+    except FrameTooLargeError as e:
+        logs.warning("expulsado", cliente_info, error=e)
+    except OSError:
+        logs.info("conexion_reseteada", cliente_info)
     finally:
-        # salir de sala si estaba dentro
-        if cliente_info["sala_id"]:
-            with salas_lock:
-                sala = salas.get(cliente_info["sala_id"])
-                if sala:
-                    sala.eliminar_jugador(cliente_info)
-                    sala.enviar_estado_sala()
-                    if len(sala.jugadores) == 0:
-                        del salas[sala.id]
+        # antes de desconectar, que borra la sala de cliente_info
+        logs.info("desconexion", cliente_info)
+        desconectar_cliente(cliente_info)
+        conn.close()
+
+
+# ---------------- motor asyncio ----------------
+
+async def atender_cliente_async(reader, writer):
+    addr = writer.get_extra_info("peername")
+    cliente_info = {"sock": None, "nombre": None, "sala_id": None, "addr": addr}
+    sock = cliente_info["sock"] = StreamConnection(writer, cliente_info)
+    metrics.sumar("conexiones_abiertas")
+    clientes.append(cliente_info)
+    framer = LineFramer()
+    logs.info("conexion", cliente_info)
 
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            with connection.tick():
+                for linea in framer.alimentar(data):
+                    procesar_linea(cliente_info, linea)
+    except FrameTooLargeError as e:
+        logs.warning("expulsado", cliente_info, error=e)
+    except ConnectionResetError:
+        logs.info("conexion_reseteada", cliente_info)
+    finally:
+        logs.info("desconexion", cliente_info)
+        desconectar_cliente(cliente_info)
         sock.close()
-        print("Cliente desconectado", addr)
 
 
-def main():
+async def servidor_async(restauradas=()):
+    server = await asyncio.start_server(atender_cliente_async, HOST, PORT,
+                                        backlog=BACKLOG_ASYNC)
+    # lo que terminan otros hilos (bots) vuelve al event loop
+    actor.usar_reinyector(asyncio.get_running_loop().call_soon_threadsafe)
+    continuar_salas(restauradas)
+    lobby.cache.arrancar(actor.desde_otro_hilo)
+    print(f"Servidor (asyncio) escuchando en {HOST}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
+
+def main_hilos(restauradas=()):
+    # con un hilo por conexion, las salas se atienden en un pool aparte
+    actor.usar_pool()
+    continuar_salas(restauradas)
+    lobby.cache.arrancar(actor.desde_otro_hilo)
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server.bind((HOST, PORT))
     server.listen(20)
     print(f"Servidor escuchando en {HOST}:{PORT}")
@@ -431,8 +1062,6 @@ def main():
     try:
         while True:
             sock, addr = server.accept()
-            print("Nuevo cliente", addr)
-            clientes.append({"sock": sock})
             threading.Thread(target=hilo_cliente,
                             args=(sock, addr),
                             daemon=True).start()
@@ -440,5 +1069,79 @@ def main():
         server.close()
 
 
+def cargar_plugins(nombres):
+    # cada plugin se registra solo al importarse (ver dispatch.registrar)
+    for nombre in nombres:
+        importlib.import_module(nombre)
+
+
+def main():
+    global PORT, ADMIN_TOKEN
+    parser = argparse.ArgumentParser(description="Servidor de Parqués")
+    parser.add_argument("--motor", choices=["hilos", "async"], default="hilos",
+                        help="hilos: un hilo por conexión; async: un solo event loop")
+    parser.add_argument("--puerto", type=int, default=PORT)
+    parser.add_argument("--shards", type=int, default=0,
+                        help="N > 0: proceso frontal + N procesos con las salas")
+    parser.add_argument("--max-cola", type=int, default=connection.MAX_COLA,
+                        help="mensajes pendientes por conexion antes de aplicar la politica")
+    parser.add_argument("--politica-cola", choices=connection.POLITICAS,
+                        default=connection.POLITICA)
+    parser.add_argument("--plugin", action="append", default=[],
+                        help="modulo que registra handlers extra (se puede repetir)")
+    parser.add_argument("--eventlog", metavar="ARCHIVO",
+                        help="registrar los eventos de las salas (ver replay.py)")
+    parser.add_argument("--snapshot", metavar="ARCHIVO",
+                        help="guardar las salas aqui y restaurarlas al arrancar")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO",
+                        help="servir las metricas en texto en http://127.0.0.1:PUERTO/")
+    parser.add_argument("--bots-tras", type=float, metavar="SEGUNDOS",
+                        help="completar con bots las salas que sigan con lugar tras SEGUNDOS")
+    parser.add_argument("--log", metavar="ARCHIVO",
+                        help="logs en JSON a este archivo, rotado (por defecto texto a stderr)")
+    parser.add_argument("--log-nivel", choices=logs.NIVELES, default="info")
+    parser.add_argument("--admin-token", default=ADMIN_TOKEN,
+                        help="token para pedir STATS desde fuera de localhost "
+                             "(por defecto $PARQUES_ADMIN_TOKEN)")
+    args = parser.parse_args()
+
+    ADMIN_TOKEN = args.admin_token
+    PORT = args.puerto
+    connection.MAX_COLA = args.max_cola
+    connection.POLITICA = args.politica_cola
+    cargar_plugins(args.plugin)
+    logs.iniciar(args.log, args.log_nivel)
+    profiling.instalar_senal()
+    if args.metricas:
+        metrics.servir_http(args.metricas)
+
+    if args.shards > 0:
+        from shards import main_shards
+        main_shards(HOST, PORT, args.shards, args.plugin, args.eventlog,
+                    args.snapshot, args.bots_tras)
+        return
+
+    if args.bots_tras:
+        bots.arrancar_relleno(args.bots_tras, completar_con_bots)
+
+    if args.eventlog:
+        eventlog.abrir(args.eventlog)
+
+    restauradas = []
+    if args.snapshot:
+        restauradas = restaurar_salas(args.snapshot)
+        print(f"{len(restauradas)} salas restauradas de {args.snapshot}")
+
+    if args.motor == "async":
+        try:
+            asyncio.run(servidor_async(restauradas))
+        except KeyboardInterrupt:
+            pass
+    else:
+        main_hilos(restauradas)
+
+
 if __name__ == "__main__":
+    # los modulos auxiliares hacen "import server": que vean este mismo modulo
+    sys.modules.setdefault("server", sys.modules[__name__])
     main()
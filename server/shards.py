@@ -0,0 +1,358 @@
+"""
+Modo multi-proceso: un proceso frontal acepta las conexiones y reparte el
+trafico de cada sala entre N procesos trabajadores segun GameRoom.id.
+
+- El frontal atiende LOGIN, chat general y el lobby (LISTAR_PARTIDAS) con
+  una tabla de salas que le van informando los trabajadores. Con esa misma
+  tabla elige sala para BUSCAR_PARTIDA y la manda al trabajador dueño.
+- Todo mensaje que trae "id_sala" (y CREAR_PARTIDA, a la que el frontal le
+  asigna el id) se reenvia al trabajador dueño de esa sala.
+- El frontal anota en cliente_info["sala_id"] la sala a la que reenvio un
+  CREAR/BUSCAR/UNIR; el trabajador le confirma donde quedo sentado (o None)
+  y FIN_PARTIDA lo libera. Con eso rechaza entrar a una segunda sala,
+  aunque este en otro trabajador.
+- Cada trabajador corre el mismo manejar_mensaje de server.py sobre sus
+  propias salas; sus envios vuelven al frontal, que los escribe al socket.
+"""
+import asyncio
+import multiprocessing
+import queue
+import threading
+import zlib
+
+import server
+from protocol import FORMATO_JSON
+import actor
+import bots
+import connection
+import eventlog
+import lobby
+import logs
+import matchmaking
+import profiling
+from connection import StreamConnection
+from framer import LineFramer, FrameTooLargeError
+
+
+def shard_de_sala(id_sala, n_shards):
+    # crc32 y no hash(): tiene que dar lo mismo en todos los procesos
+    return zlib.crc32(str(id_sala).encode("utf-8")) % n_shards
+
+
+# mensajes que sientan al cliente en una sala
+ENTRAR = ("CREAR_PARTIDA", "BUSCAR_PARTIDA", "UNIR_PARTIDA")
+
+
+# ---------------- proceso trabajador ----------------
+
+class SockRemoto:
+    """Socket falso del trabajador: lo enviado viaja al frontal por la cola."""
+
+    def __init__(self, cliente_id, salida):
+        self.cliente_id = cliente_id
+        self.salida = salida
+        self.formato = FORMATO_JSON
+
+    def enviar(self, data, clave=None):
+        self.salida.put(("enviar", self.cliente_id, data, clave))
+
+    def close(self):
+        pass
+
+
+def _crear_partida_remota(cliente_info, data):
+    sala = server.crear_sala(cliente_info, data.get("modo", "1v1v1v1"),
+                             id_sala=data["id_sala"])
+    server.enviar_json(cliente_info["sock"], {
+        "tipo": "PARTIDA_CREADA",
+        "data": sala.info_publica()
+    })
+
+
+def _buscar_partida_remota(cliente_info, data):
+    # la sala ya la eligió (o reservó, si es nueva) el frontal
+    server.manejar_buscar_partida(cliente_info, data, cliente_info["sock"],
+                                  id_elegida=data["id_sala"])
+
+
+def _informar_sala(salida, id_sala):
+    if not id_sala:
+        return
+    sala = server.salas.get(id_sala)
+    salida.put(("lobby", id_sala, sala.info_publica() if sala else None))
+
+
+def _recibir(entrada, local):
+    while True:
+        orden = entrada.get()
+        local.put(orden)
+        if orden is None:
+            return
+
+
+def proceso_shard(entrada, salida, plugins, ruta_eventlog=None, ruta_snapshot=None,
+                  config_log=None, bots_tras=None):
+    server.cargar_plugins(plugins)
+    if config_log is not None:
+        logs.iniciar(**config_log)
+    profiling.instalar_senal()      # kill -USR2 <pid del trabajador>
+    if ruta_eventlog:
+        eventlog.abrir(ruta_eventlog)
+    restauradas = server.restaurar_salas(ruta_snapshot) if ruta_snapshot else []
+    for sala in restauradas:
+        _informar_sala(salida, sala.id)
+    if bots_tras:
+        def completar(sala):
+            server.completar_con_bots(sala)
+            _informar_sala(salida, sala.id)
+        bots.arrancar_relleno(bots_tras, completar)
+    remotos = {}    # cliente_id -> cliente_info dentro de este trabajador
+
+    # las ordenes del frontal y lo que terminan otros hilos (bots) llegan
+    # a la misma cola, asi las salas siguen viviendo en un solo hilo
+    local = queue.Queue()
+    threading.Thread(target=_recibir, args=(entrada, local), daemon=True).start()
+    actor.usar_reinyector(lambda funcion, *args: local.put(("llamar", funcion, args)))
+
+    def vencer(sala):
+        server.vencer_ausentes(sala)
+        _informar_sala(salida, sala.id)
+    server.continuar_salas(restauradas, vencer)
+
+    while True:
+        orden = local.get()
+        if orden is None:
+            break
+
+        if orden[0] == "llamar":
+            try:
+                orden[1](*orden[2])
+            except Exception:
+                logs.error("error_shard")
+            continue
+
+        if orden[0] == "baja":
+            cliente_info = remotos.pop(orden[1], None)
+            if cliente_info:
+                id_sala = cliente_info["sala_id"]
+                server.desconectar_cliente(cliente_info)
+                _informar_sala(salida, id_sala)
+            continue
+
+        _, cliente_id, perfil, msg = orden
+        cliente_info = remotos.get(cliente_id)
+        if cliente_info is None:
+            cliente_info = {"sock": SockRemoto(cliente_id, salida),
+                            "nombre": None, "sala_id": None}
+            remotos[cliente_id] = cliente_info
+        cliente_info["sock"].formato = perfil.pop("formato")
+        cliente_info.update(perfil)
+
+        data = msg.get("data", {})
+        try:
+            if msg.get("tipo") == "CREAR_PARTIDA":
+                _crear_partida_remota(cliente_info, data)
+            elif msg.get("tipo") == "BUSCAR_PARTIDA":
+                _buscar_partida_remota(cliente_info, data)
+            else:
+                server.manejar_mensaje(cliente_info, msg, cliente_info["sock"])
+        except Exception:
+            logs.error("error_shard", cliente_info, tipo=msg.get("tipo"))
+
+        _informar_sala(salida, data.get("id_sala"))
+        if msg.get("tipo") in ENTRAR:
+            # donde quedo de verdad, para el "ya estás en una partida" del frontal
+            sentado = server.en_partida(cliente_info)
+            salida.put(("ubicacion", cliente_id, cliente_info["sala_id"] if sentado else None))
+
+
+# ---------------- proceso frontal ----------------
+
+class Frontal:
+    def __init__(self, n_shards, plugins=(), ruta_eventlog=None, ruta_snapshot=None,
+                 bots_tras=None):
+        ctx = multiprocessing.get_context("spawn")
+        self.n_shards = n_shards
+        self.salida = ctx.Queue()
+        self.entradas = [ctx.Queue() for _ in range(n_shards)]
+        # un eventlog, un snapshot y un log por trabajador: ruta.0, ruta.1, ...
+        # (para restaurar hay que arrancar con el mismo numero de shards)
+        config_log = logs.configuracion()
+        self.procesos = [
+            ctx.Process(target=proceso_shard,
+                        args=(q, self.salida, list(plugins),
+                              f"{ruta_eventlog}.{i}" if ruta_eventlog else None,
+                              f"{ruta_snapshot}.{i}" if ruta_snapshot else None,
+                              dict(config_log, ruta=f"{config_log['ruta']}.{i}"
+                                   if config_log.get("ruta") else None),
+                              bots_tras),
+                        daemon=True)
+            for i, q in enumerate(self.entradas)
+        ]
+        self.lobby = lobby.LobbyCache()     # lo mantienen los shards
+        self.pool = matchmaking.Pool()      # salas abiertas segun self.lobby
+        self.por_id = {}        # cliente_id -> cliente_info
+        self.siguiente_id = 0
+        self.loop = None
+
+    def arrancar(self):
+        for p in self.procesos:
+            p.start()
+
+    def detener(self):
+        for q in self.entradas:
+            q.put(None)
+
+    # mensajes shard -> frontal
+
+    def hilo_salida(self):
+        while True:
+            lote = [self.salida.get()]
+            try:
+                while len(lote) < 256:
+                    lote.append(self.salida.get_nowait())
+            except queue.Empty:
+                pass
+            self.loop.call_soon_threadsafe(self.entregar, lote)
+
+    def entregar(self, lote):
+        with connection.tick():
+            self._entregar(lote)
+
+    def _entregar(self, lote):
+        for evento in lote:
+            if evento[0] == "enviar":
+                cliente_info = self.por_id.get(evento[1])
+                if cliente_info:
+                    cliente_info["sock"].enviar(evento[2], evento[3])
+                    if evento[3] == "FIN_PARTIDA":
+                        cliente_info["sala_id"] = None
+            elif evento[0] == "ubicacion":
+                cliente_info = self.por_id.get(evento[1])
+                if cliente_info:
+                    cliente_info["sala_id"] = evento[2]
+            elif evento[0] == "lobby":
+                info = evento[2]
+                self.lobby.actualizar(evento[1], info)
+                if info is None:
+                    self.pool.quitar(evento[1])
+                else:
+                    libres = 0 if info.get("iniciada") else info["max"] - info["jugadores"]
+                    self.pool.actualizar(evento[1], info["modo"], libres)
+
+    # mensajes cliente -> frontal
+
+    def reenviar(self, cliente_info, msg, id_sala):
+        idx = shard_de_sala(id_sala, self.n_shards)
+        cliente_info["shards"].add(idx)
+        # lo que el LOGIN dejó en el frontal y el shard necesita saber
+        perfil = {"nombre": cliente_info["nombre"],
+                  "deltas": cliente_info.get("deltas", False),
+                  "formato": cliente_info["sock"].formato}
+        self.entradas[idx].put(("msg", cliente_info["id"], perfil, msg))
+
+    def manejar(self, cliente_info, msg, sock):
+        tipo = msg.get("tipo")
+        data = msg.get("data", {})
+
+        if tipo in ENTRAR and cliente_info["sala_id"]:
+            # sentado (o entrando) en una sala, quizas de otro trabajador
+            server.enviar_json(sock, {"tipo": "ERROR",
+                                      "data": {"mensaje": "Ya estás en una partida"}})
+            return
+
+        if tipo == "CREAR_PARTIDA":
+            data["id_sala"] = server.nuevo_id_sala()
+            msg["data"] = data
+            cliente_info["sala_id"] = data["id_sala"]
+            self.reenviar(cliente_info, msg, data["id_sala"])
+
+        elif tipo == "BUSCAR_PARTIDA":
+            modo = data.get("modo", "1v1v1v1")
+            id_sala = self.pool.tomar(modo)
+            if id_sala is None:
+                # sala nueva; queda abierta ya para los que busquen detrás
+                id_sala = server.nuevo_id_sala()
+                self.pool.actualizar(id_sala, modo, matchmaking.MAX_LIBRES - 1)
+            data["id_sala"] = id_sala
+            msg["data"] = data
+            cliente_info["sala_id"] = id_sala
+            self.reenviar(cliente_info, msg, id_sala)
+
+        elif tipo == "LISTAR_PARTIDAS":
+            respuesta = self.lobby.responder(data)
+            if respuesta is None:
+                server.enviar_json(sock, {"tipo": "ERROR",
+                                          "data": {"mensaje": "Consulta inválida"}})
+            else:
+                sock.enviar(respuesta, "PARTIDAS_DISPONIBLES")
+
+        elif tipo == "SUSCRIBIR_LOBBY":
+            if data.get("activo", True):
+                sock.enviar(self.lobby.suscribir(sock), "LOBBY_DIFF")
+            else:
+                self.lobby.desuscribir(sock)
+
+        elif data.get("id_sala"):
+            if tipo == "UNIR_PARTIDA":
+                cliente_info["sala_id"] = data["id_sala"]
+            self.reenviar(cliente_info, msg, data["id_sala"])
+
+        else:
+            # chat general y errores se resuelven aqui mismo
+            server.manejar_mensaje(cliente_info, msg, sock)
+
+    async def atender(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        self.siguiente_id += 1
+        cliente_info = {"sock": None, "nombre": None, "sala_id": None, "addr": addr,
+                        "id": self.siguiente_id, "shards": set()}
+        sock = cliente_info["sock"] = StreamConnection(writer, cliente_info)
+        self.por_id[cliente_info["id"]] = cliente_info
+        server.clientes.append(cliente_info)
+        framer = LineFramer()
+        logs.info("conexion", cliente_info)
+
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                with connection.tick():
+                    for linea in framer.alimentar(data):
+                        server.procesar_linea(cliente_info, linea,
+                                              manejar=self.manejar)
+        except FrameTooLargeError as e:
+            logs.warning("expulsado", cliente_info, error=e)
+        except ConnectionResetError:
+            logs.info("conexion_reseteada", cliente_info)
+        finally:
+            logs.info("desconexion", cliente_info)
+            for idx in cliente_info["shards"]:
+                self.entradas[idx].put(("baja", cliente_info["id"]))
+            del self.por_id[cliente_info["id"]]
+            self.lobby.desuscribir(sock)
+            server.clientes.remove(cliente_info)
+            sock.close()
+
+    async def servir(self, host, port):
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self.hilo_salida, daemon=True).start()
+        self.lobby.arrancar(self.loop.call_soon_threadsafe)
+        srv = await asyncio.start_server(self.atender, host, port,
+                                         backlog=server.BACKLOG_ASYNC)
+        print(f"Servidor (frontal, {self.n_shards} shards) escuchando en {host}:{port}")
+        async with srv:
+            await srv.serve_forever()
+
+
+def main_shards(host, port, n_shards, plugins=(), ruta_eventlog=None,
+                ruta_snapshot=None, bots_tras=None):
+    frontal = Frontal(n_shards, plugins, ruta_eventlog, ruta_snapshot, bots_tras)
+    frontal.arrancar()
+    try:
+        asyncio.run(frontal.servir(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        frontal.detener()
@@ -0,0 +1,224 @@
+"""
+Simulador sin red de partidas completas de 4 colores con las reglas de
+game.py (salida con 1 o 6, captura en la casilla de llegada, dado que no
+deja jugar pasa el turno). Cada jugador mueve una ficha legal al azar.
+
+    python simulator.py --partidas 2000
+    python simulator.py --partidas 100000 --numpy
+
+El modo --numpy avanza todas las partidas a la vez, un turno por paso,
+con las mismas game.TRANSICIONES que Tablero. Necesita NumPy, que solo
+se importa si se pide. Los dos modos usan generadores distintos, asi que
+con la misma semilla no dan las mismas partidas sino las mismas
+estadisticas; --comparar corre ambos y sale con codigo 1 si se apartan
+mas de --tolerancia:
+
+    python simulator.py --partidas 4000 --semilla 1 --comparar
+
+Una partida que no termina en --max-turnos se cuenta como cortada.
+"""
+import argparse
+import random
+import sys
+import time
+
+from game import Tablero, COLORES, BASE, EN_META, FIN_LEN, TRANSICIONES, NO_MUEVE
+
+
+class Estadisticas:
+    def __init__(self):
+        self.partidas = 0
+        self.terminadas = 0
+        self.turnos = 0
+        self.movimientos = 0
+        self.pasados = 0        # tiradas sin jugada posible
+        self.capturas = 0
+        self.victorias = [0] * len(COLORES)
+
+    def reporte(self, segundos):
+        return {
+            "partidas": self.partidas,
+            "terminadas": self.terminadas,
+            "cortadas": self.partidas - self.terminadas,
+            "partidas_por_seg": self.partidas / segundos if segundos else 0.0,
+            "turnos_por_seg": self.turnos / segundos if segundos else 0.0,
+            "turnos_por_partida": self.turnos / self.partidas if self.partidas else 0.0,
+            "movimientos": self.movimientos,
+            "pasados": self.pasados,
+            "capturas": self.capturas,
+            "victorias": dict(zip(COLORES, self.victorias)),
+            "segundos": segundos,
+        }
+
+
+def jugar_partida(rnd, stats, max_turnos):
+    tablero = Tablero()
+    for turno in range(max_turnos):
+        color = COLORES[turno % 4]
+        pasos = rnd.randint(1, 6)
+        stats.turnos += 1
+
+        legales = tablero.movimientos_legales(color, pasos)
+        if not legales:
+            stats.pasados += 1
+            continue
+
+        pieza = tablero.pieza(color, rnd.choice(legales))
+        capturadas = tablero.mover(pieza, tablero.destino(pieza, pasos))
+        stats.movimientos += 1
+        stats.capturas += len(capturadas)
+
+        if tablero.gano(color):
+            stats.terminadas += 1
+            stats.victorias[turno % 4] += 1
+            break
+    stats.partidas += 1
+
+
+def simular(partidas, semilla=None, max_turnos=2000):
+    rnd = random.Random(semilla)
+    stats = Estadisticas()
+    inicio = time.perf_counter()
+    for _ in range(partidas):
+        jugar_partida(rnd, stats, max_turnos)
+    return stats.reporte(time.perf_counter() - inicio)
+
+
+def simular_numpy(partidas, semilla=None, max_turnos=2000):
+    import numpy as np
+
+    rng = np.random.default_rng(semilla)
+    stats = Estadisticas()
+    stats.partidas = partidas
+
+    # pos[p, ficha] con la misma codificacion que Tablero.pos
+    pos = np.zeros((partidas, 16), dtype=np.int16)
+    vivas = np.arange(partidas)
+    tablas = np.frombuffer(b"".join(TRANSICIONES), dtype=np.uint8).reshape(len(COLORES), -1)
+    pasos_por_pos = tablas.shape[1] // (EN_META + FIN_LEN + 1)
+    meta_final = EN_META + FIN_LEN
+    filas = np.arange(partidas)
+
+    inicio = time.perf_counter()
+    for turno in range(max_turnos):
+        if vivas.size == 0:
+            break
+        color = turno % 4
+        n = vivas.size
+        stats.turnos += n
+        pasos = rng.integers(1, 7, size=n, dtype=np.int16)
+        propias = pos[vivas, color * 4:color * 4 + 4]            # (n, 4)
+
+        # destino de cada una de las 4 fichas, una busqueda en la tabla
+        destino = tablas[color][propias * pasos_por_pos + pasos[:, None]].astype(np.int16)
+        legal = destino != NO_MUEVE
+        con_jugada = legal.any(axis=1)
+        stats.pasados += int(n - con_jugada.sum())
+
+        # ficha legal al azar: la de mayor clave aleatoria entre las legales
+        clave = np.where(legal, rng.random((n, 4)), -1.0)
+        elegida = clave.argmax(axis=1)
+        mueven = np.flatnonzero(con_jugada)
+        partida = vivas[mueven]
+        ficha = color * 4 + elegida[mueven]
+        llegada = destino[mueven, elegida[mueven]]
+        stats.movimientos += int(mueven.size)
+
+        # capturas: fichas rivales en la casilla de llegada vuelven a base
+        rivales = np.ones(16, dtype=bool)
+        rivales[color * 4:color * 4 + 4] = False
+        en_llegada = ((pos[partida] == llegada[:, None])
+                      & rivales[None, :]
+                      & (llegada < EN_META)[:, None])
+        stats.capturas += int(en_llegada.sum())
+        sub = pos[partida]
+        sub[en_llegada] = BASE
+        sub[filas[:mueven.size], ficha] = llegada
+        pos[partida] = sub
+
+        # terminadas: las 4 fichas del color al final de la meta
+        gano = (pos[vivas, color * 4:color * 4 + 4] == meta_final).all(axis=1)
+        ganadoras = int(gano.sum())
+        if ganadoras:
+            stats.terminadas += ganadoras
+            stats.victorias[color] += ganadoras
+            vivas = vivas[~gano]
+
+    return stats.reporte(time.perf_counter() - inicio)
+
+
+def proporciones(reporte):
+    """Lo que no depende de cuantas partidas se jugaron."""
+    turnos = reporte["movimientos"] + reporte["pasados"]
+    terminadas = reporte["terminadas"] or 1
+    salida = {
+        "turnos_por_partida": reporte["turnos_por_partida"],
+        "movimientos_por_turno": reporte["movimientos"] / turnos,
+        "capturas_por_turno": reporte["capturas"] / turnos,
+        "cortadas": reporte["cortadas"] / reporte["partidas"],
+    }
+    for color, n in reporte["victorias"].items():
+        salida[f"victorias_{color}"] = n / terminadas
+    return salida
+
+
+def comparar(partidas, semilla=None, max_turnos=2000, tolerancia=0.03):
+    """[(nombre, simular, simular_numpy, ok)]: relativo para las tasas, absoluto para las fracciones."""
+    reporte_a = simular(partidas, semilla, max_turnos)
+    reporte_b = simular_numpy(partidas, semilla, max_turnos)
+    a, b = proporciones(reporte_a), proporciones(reporte_b)
+    # con pocas terminadas las victorias por color son ruido: 3 errores estandar de margen
+    terminadas = max(1, min(reporte_a["terminadas"], reporte_b["terminadas"]))
+    filas = []
+    for nombre, valor in a.items():
+        margen = tolerancia
+        if nombre.startswith("victorias_"):
+            margen = max(tolerancia, 3 * (valor * (1 - valor) / terminadas) ** 0.5)
+        if nombre.startswith("victorias_") or nombre == "cortadas":
+            diferencia = abs(valor - b[nombre])
+        else:
+            diferencia = abs(valor - b[nombre]) / valor if valor else abs(b[nombre])
+        filas.append((nombre, valor, b[nombre], diferencia <= margen))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de partidas de Parqués")
+    parser.add_argument("--partidas", type=int, default=1000)
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--max-turnos", type=int, default=2000,
+                        help="turnos antes de dar la partida por cortada")
+    parser.add_argument("--numpy", action="store_true",
+                        help="avanza todas las partidas a la vez (requiere NumPy)")
+    parser.add_argument("--comparar", action="store_true",
+                        help="correr los dos modos y comparar sus estadisticas")
+    parser.add_argument("--tolerancia", type=float, default=0.03)
+    args = parser.parse_args()
+
+    if args.comparar:
+        try:
+            filas = comparar(args.partidas, args.semilla, args.max_turnos, args.tolerancia)
+        except ImportError:
+            parser.error("--comparar requiere NumPy instalado")
+        for nombre, a, b, ok in filas:
+            print(f"{nombre:22} {a:10.4f} {b:10.4f}  {'ok' if ok else 'DISTINTO'}")
+        if not all(ok for *_, ok in filas):
+            sys.exit(1)
+        return
+
+    if args.numpy:
+        try:
+            reporte = simular_numpy(args.partidas, args.semilla, args.max_turnos)
+        except ImportError:
+            parser.error("--numpy requiere NumPy instalado")
+    else:
+        reporte = simular(args.partidas, args.semilla, args.max_turnos)
+
+    for clave, valor in reporte.items():
+        if isinstance(valor, float):
+            valor = f"{valor:.2f}"
+        print(f"{clave:20} {valor}")
+
+
+if __name__ == "__main__":
+    main()
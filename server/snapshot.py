@@ -0,0 +1,210 @@
+"""
+Fotos de las salas en un archivo mapeado en memoria, para reiniciar el
+servidor sin perder las partidas.
+
+El archivo tiene MAX_SALAS ranuras de tamaño fijo; cada sala ocupa una.
+Cada ranura tiene dos mitades y se escribe siempre la mas vieja:
+
+    version (4) | crc32 (4) | largo (2) | estado de la sala (largo bytes)
+
+Al leer se usa la mitad con crc valido y version mas alta, asi una
+escritura cortada a medias deja la foto anterior intacta. largo = 0
+marca la ranura libre.
+
+Cada INTERVALO segundos un hilo le pide a cada sala, por su actor, que
+empaquete su estado (el actor es el unico que lo toca, asi la foto es
+consistente y la sala no se detiene). Solo se escriben las ranuras de
+salas cuyo estado cambio desde la foto anterior.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import actor
+import logs
+
+MAX_SALAS = 4096
+TAM_MITAD = 1536
+INTERVALO = 1.0
+
+_MITAD = struct.Struct(">IIH")              # version, crc, largo
+_FIJO = struct.Struct(">4sIIBBBBBI")        # id, semilla, dados, estado (bit 0 iniciada,
+                                            # bit 1 terminada), turno_idx,
+                                            # ultimo_dado (0 = ninguno), legales, jugadores, seq
+
+_snap = None
+
+
+def _texto(valor):
+    crudo = valor.encode("utf-8")
+    if len(crudo) > 255:
+        raise ValueError("texto demasiado largo para la foto")
+    return bytes((len(crudo),)) + crudo
+
+
+def empaquetar(sala):
+    partes = [
+        _FIJO.pack(bytes.fromhex(sala.id), sala.semilla, sala.dados,
+                   sala.iniciada | sala.terminada << 1, sala.turno_idx, sala.ultimo_dado or 0,
+                   sum(1 << i for i in sala.legales), len(sala.jugadores), sala.seq),
+        _texto(sala.modo),
+    ]
+    for jugador, listo in zip(sala.jugadores, sala.listos):
+        partes.append(bytes((bool(jugador.get("bot")) | bool(listo) << 1,)))
+        partes.append(_texto(jugador["nombre"]))
+    partes.append(bytes(sala.tablero.pos))
+    return b"".join(partes)
+
+
+def desempaquetar(datos):
+    (crudo, semilla, dados, marcas_sala, turno_idx, ultimo_dado, legales,
+     n_jugadores, seq) = _FIJO.unpack_from(datos)
+    i = _FIJO.size
+
+    def texto():
+        nonlocal i
+        largo = datos[i]
+        valor = bytes(datos[i + 1:i + 1 + largo]).decode("utf-8")
+        i += 1 + largo
+        return valor
+
+    modo = texto()
+    jugadores = []
+    for _ in range(n_jugadores):
+        marcas = datos[i]
+        i += 1
+        jugadores.append({"nombre": texto(), "bot": bool(marcas & 1),
+                          "listo": bool(marcas & 2)})
+    return {
+        "id": crudo.hex(), "semilla": semilla, "dados": dados,
+        "iniciada": bool(marcas_sala & 1), "terminada": bool(marcas_sala & 2),
+        "turno_idx": turno_idx,
+        "ultimo_dado": ultimo_dado or None,
+        "legales": [k for k in range(4) if legales >> k & 1],
+        "seq": seq, "modo": modo, "jugadores": jugadores,
+        "pos": list(datos[i:i + 16]),
+    }
+
+
+class Snapshots:
+    def __init__(self, ruta, max_salas=MAX_SALAS):
+        tam = max_salas * 2 * TAM_MITAD
+        fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != tam:
+                os.ftruncate(fd, tam)
+            self.mm = mmap.mmap(fd, tam)
+        finally:
+            os.close(fd)
+        self.max_salas = max_salas
+        self.ranuras = {}           # id_sala -> indice de ranura
+        self.libres = []            # se llena en leer()
+        self.versiones = [0] * max_salas
+        self.ultimos = {}           # id_sala -> bytes de la ultima foto escrita
+        self.pendientes = {}        # id_sala -> bytes por escribir
+        self.lock = threading.Lock()
+
+    def _offset(self, ranura, mitad):
+        return (ranura * 2 + mitad) * TAM_MITAD
+
+    def leer(self):
+        """Estados validos guardados en el archivo."""
+        estados = []
+        for ranura in range(self.max_salas):
+            mejor = None
+            for mitad in (0, 1):
+                inicio = self._offset(ranura, mitad)
+                version, crc, largo = _MITAD.unpack_from(self.mm, inicio)
+                if largo > TAM_MITAD - _MITAD.size:
+                    continue
+                datos = self.mm[inicio + _MITAD.size:inicio + _MITAD.size + largo]
+                if zlib.crc32(datos) != crc or (mejor and mejor[0] >= version):
+                    continue
+                mejor = (version, datos)
+            if mejor is None:
+                continue
+            self.versiones[ranura] = mejor[0]
+            if mejor[1]:
+                estado = desempaquetar(mejor[1])
+                self.ranuras[estado["id"]] = ranura
+                self.ultimos[estado["id"]] = mejor[1]
+                estados.append(estado)
+        usadas = set(self.ranuras.values())
+        self.libres = [r for r in reversed(range(self.max_salas)) if r not in usadas]
+        return estados
+
+    def _escribir(self, ranura, datos):
+        version = self.versiones[ranura] + 1
+        # la mitad que tiene la version vieja (las versiones alternan de mitad)
+        inicio = self._offset(ranura, version & 1)
+        self.mm[inicio + _MITAD.size:inicio + _MITAD.size + len(datos)] = datos
+        _MITAD.pack_into(self.mm, inicio, version, zlib.crc32(datos), len(datos))
+        self.versiones[ranura] = version
+
+    def escribir_pendientes(self):
+        with self.lock:
+            pendientes, self.pendientes = self.pendientes, {}
+        for id_sala, datos in pendientes.items():
+            ranura = self.ranuras.get(id_sala)
+            if ranura is None:
+                if not self.libres:
+                    logs.warning("foto_sin_ranuras", sala=id_sala)
+                    continue
+                ranura = self.ranuras[id_sala] = self.libres.pop()
+            self._escribir(ranura, datos)
+            self.ultimos[id_sala] = datos
+        if pendientes:
+            self.mm.flush()
+
+    def liberar(self, id_sala):
+        with self.lock:
+            self.pendientes.pop(id_sala, None)
+        ranura = self.ranuras.pop(id_sala, None)
+        self.ultimos.pop(id_sala, None)
+        if ranura is not None:
+            self._escribir(ranura, b"")
+            self.libres.append(ranura)
+
+    def empaquetar_sala(self, sala):
+        # corre en el actor de la sala
+        if sala.cerrada:
+            return
+        try:
+            datos = empaquetar(sala)
+        except ValueError as e:
+            logs.warning("sala_sin_foto", sala=sala.id, error=e)
+            return
+        if len(datos) > TAM_MITAD - _MITAD.size or datos == self.ultimos.get(sala.id):
+            return
+        with self.lock:
+            self.pendientes[sala.id] = datos
+
+    def hilo(self, obtener_salas):
+        while True:
+            time.sleep(INTERVALO)
+            try:
+                self.escribir_pendientes()
+                vivas = obtener_salas()
+                ids = {s.id for s in vivas}
+                for id_sala in [i for i in self.ranuras if i not in ids]:
+                    self.liberar(id_sala)
+                for sala in vivas:
+                    actor.desde_otro_hilo(sala.actor.enviar, self.empaquetar_sala, sala)
+            except Exception:
+                logs.error("error_foto")
+
+
+def abrir(ruta):
+    """Abre (o crea) el archivo y devuelve los estados que tenia guardados."""
+    global _snap
+    _snap = Snapshots(ruta)
+    return _snap.leer()
+
+
+def arrancar(obtener_salas):
+    # se llama cuando el motor ya configuro actor (pool o reinyector)
+    if _snap is not None:
+        threading.Thread(target=_snap.hilo, args=(obtener_salas,), daemon=True).start()
@@ -0,0 +1,78 @@
+"""BUSCAR_PARTIDA sobre el motor sin pool (el actor corre en el mismo hilo)."""
+import json
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import matchmaking  # noqa: E402
+import server  # noqa: E402
+from protocol import FORMATO_JSON  # noqa: E402
+
+
+class SockFalso:
+    def __init__(self):
+        self.formato = FORMATO_JSON
+        self.recibidos = []
+
+    def enviar(self, data, clave=None):
+        self.recibidos.append(json.loads(data))
+
+    def tipos(self):
+        return [m["tipo"] for m in self.recibidos]
+
+
+def cliente(nombre):
+    return {"sock": SockFalso(), "nombre": nombre, "sala_id": None}
+
+
+def buscar(cliente_info, data=None):
+    # en un hilo aparte: si la busqueda se queda girando, el test falla en vez de colgarse
+    hilo = threading.Thread(target=server.manejar_buscar_partida,
+                            args=(cliente_info, data or {}, cliente_info["sock"]),
+                            daemon=True)
+    hilo.start()
+    hilo.join(5)
+    return not hilo.is_alive()
+
+
+class TestBuscarPartida(unittest.TestCase):
+    def setUp(self):
+        server.salas.clear()
+        matchmaking.pool = matchmaking.Pool()
+
+    def test_dos_busquedas_del_mismo_jugador(self):
+        ana = cliente("ana")
+        self.assertTrue(buscar(ana))
+        self.assertTrue(buscar(ana))
+        self.assertEqual(len(server.salas), 1)
+        self.assertEqual(ana["sock"].tipos()[-1], "ERROR")
+
+    def test_nombre_repetido_busca_otra_sala(self):
+        primero, segundo = cliente("ana"), cliente("ana")
+        self.assertTrue(buscar(primero))
+        self.assertTrue(buscar(segundo))
+        self.assertEqual(len(server.salas), 2)
+        self.assertNotEqual(primero["sala_id"], segundo["sala_id"])
+        self.assertIn("UNIDO_A_PARTIDA", segundo["sock"].tipos())
+
+    def test_reintentos_acotados(self):
+        # todas las salas abiertas rechazan el nombre: se corta con ERROR
+        for _ in range(server.MAX_REINTENTOS_BUSQUEDA + 2):
+            server.crear_sala(cliente("ana"), "1v1v1v1")
+        otro = cliente("ana")
+        self.assertTrue(buscar(otro))
+        self.assertEqual(otro["sock"].tipos(), ["ERROR"])
+        self.assertIsNone(otro["sala_id"])
+
+    def test_id_sala_del_cliente_se_ignora(self):
+        ana = cliente("ana")
+        self.assertTrue(buscar(ana, {"id_sala": "zz"}))
+        self.assertNotIn("zz", server.salas)
+        self.assertIn(ana["sala_id"], server.salas)
+
+
+if __name__ == "__main__":
+    unittest.main()
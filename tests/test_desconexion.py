@@ -0,0 +1,66 @@
+"""Cerrar la conexion mientras un UNIR_PARTIDA espera en el actor (motor de hilos)."""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import actor  # noqa: E402
+import matchmaking  # noqa: E402
+import server  # noqa: E402
+from protocol import FORMATO_JSON  # noqa: E402
+
+
+class SockFalso:
+    formato = FORMATO_JSON
+
+    def enviar(self, data, clave=None):
+        pass
+
+
+def cliente(nombre):
+    return {"sock": SockFalso(), "nombre": nombre, "sala_id": None}
+
+
+def esperar_actor(sala):
+    # un mensaje al final de la bandeja: cuando corre, lo anterior ya corrió
+    hecho = threading.Event()
+    sala.actor.enviar(hecho.set)
+    return hecho.wait(5)
+
+
+class TestUnirYCerrar(unittest.TestCase):
+    def setUp(self):
+        server.salas.clear()
+        matchmaking.pool = matchmaking.Pool()
+        actor.usar_pool()
+
+    def tearDown(self):
+        actor._pool.shutdown()
+        actor._pool = None
+
+    def test_unir_y_cerrar(self):
+        host = cliente("host")
+        sala = server.crear_sala(host, "1v1v1v1")
+        # el actor queda ocupado hasta que la conexion ya se cerró
+        soltar = threading.Event()
+        sala.actor.enviar(soltar.wait, 5)
+
+        g1 = cliente("g1")
+        server.manejar_mensaje(g1, {"tipo": "UNIR_PARTIDA",
+                                    "data": {"id_sala": sala.id}}, g1["sock"])
+        server.desconectar_cliente(g1)
+        soltar.set()
+        self.assertTrue(esperar_actor(sala))
+        self.assertEqual([j["nombre"] for j in sala.jugadores], ["host"])
+
+        # con el ultimo humano fuera la sala se cierra y sale del lobby
+        server.desconectar_cliente(host)
+        self.assertTrue(esperar_actor(sala))
+        self.assertTrue(sala.cerrada)
+        self.assertNotIn(sala.id, server.salas)
+
+
+if __name__ == "__main__":
+    unittest.main()
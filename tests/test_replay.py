@@ -0,0 +1,91 @@
+"""replay.reconstruir tiene que terminar en el mismo estado que la sala en vivo."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import eventlog  # noqa: E402
+import matchmaking  # noqa: E402
+import replay  # noqa: E402
+import server  # noqa: E402
+from protocol import FORMATO_JSON  # noqa: E402
+
+
+class SockFalso:
+    formato = FORMATO_JSON
+
+    def __init__(self):
+        self.recibidos = []
+
+    def enviar(self, data, clave=None):
+        self.recibidos.append(json.loads(data))
+
+
+def cliente(nombre):
+    return {"sock": SockFalso(), "nombre": nombre, "sala_id": None}
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        server.salas.clear()
+        matchmaking.pool = matchmaking.Pool()
+        fd, self.ruta = tempfile.mkstemp(suffix=".log")
+        os.close(fd)
+        eventlog.abrir(self.ruta)
+
+    def tearDown(self):
+        eventlog._log.archivo.close()
+        eventlog._log = None
+        os.unlink(self.ruta)
+
+    def mensaje(self, jugador, tipo, sala, **data):
+        data["id_sala"] = sala.id
+        server.manejar_mensaje(jugador, {"tipo": tipo, "data": data}, jugador["sock"])
+
+    def jugar_hasta(self, sala, turno_idx):
+        # cada jugador tira y mueve la primera ficha legal hasta que le toque a turno_idx
+        for _ in range(200):
+            if sala.turno_idx == turno_idx:
+                return
+            actual = sala.jugador_actual()
+            self.mensaje(actual, "LANZAR_DADO", sala)
+            if sala.legales:
+                self.mensaje(actual, "MOVER_FICHA", sala, indice_ficha=sala.legales[0])
+        self.fail("el turno nunca llegó a %d" % turno_idx)
+
+    def comparar(self, sala):
+        eventlog._log.vaciar()
+        with open(self.ruta, "rb") as f:
+            salas, _, distintos = replay.reconstruir(f.read(), verificar=True)
+        reconstruida = salas[bytes.fromhex(sala.id)]
+        self.assertEqual(distintos, [])
+        self.assertEqual(reconstruida.turno_idx, sala.turno_idx)
+        self.assertEqual(reconstruida.bots, [bool(j.get("bot")) for j in sala.jugadores])
+        self.assertEqual(reconstruida.listos, sala.listos)
+        self.assertEqual(reconstruida.dados, sala.dados)
+        self.assertEqual(list(reconstruida.tablero.pos), list(sala.tablero.pos))
+
+    def test_salida_antes_del_turno(self):
+        jugadores = [cliente(n) for n in ("a", "b", "c", "d")]
+        sala = server.crear_sala(jugadores[0], "1v1v1v1")
+        for j in jugadores[1:]:
+            self.mensaje(j, "UNIR_PARTIDA", sala)
+        for j in jugadores:
+            self.mensaje(j, "CAMBIAR_LISTO", sala, listo=True)
+        self.assertTrue(sala.iniciada)
+
+        self.jugar_hasta(sala, 2)
+        # se va uno que ya jugó: el turno se corre un asiento sin anotar TURNO
+        server.desconectar_cliente(jugadores[0])
+        self.assertEqual(sala.turno_idx, 1)
+        self.comparar(sala)
+
+        self.jugar_hasta(sala, 0)
+        self.comparar(sala)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""simular_numpy tiene que dar las mismas estadisticas que simular."""
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+import simulator  # noqa: E402
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "sin NumPy")
+class TestSimularNumpy(unittest.TestCase):
+    def test_mismas_estadisticas(self):
+        # generadores distintos: se compara con margen para 1000 partidas
+        for nombre, a, b, ok in simulator.comparar(1000, semilla=7, tolerancia=0.05):
+            self.assertTrue(ok, f"{nombre}: simular {a:.4f}, simular_numpy {b:.4f}")
+
+    def test_partidas_cortadas(self):
+        filas = dict((f[0], f[1:]) for f in simulator.comparar(500, semilla=3, max_turnos=200,
+                                                                tolerancia=0.05))
+        a, b, ok = filas["cortadas"]
+        self.assertGreater(a, 0)
+        self.assertTrue(ok, f"cortadas: simular {a:.4f}, simular_numpy {b:.4f}")
+
+
+if __name__ == "__main__":
+    unittest.main()